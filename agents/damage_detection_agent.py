@@ -1,7 +1,11 @@
+import asyncio
+import threading
 import time
-import random
-from pathlib import Path
-from ultralytics import YOLO
+import numpy as np
+from utils.yolo_backend import (
+    load_yolo, load_async_detector, boxes_xyxy, resolve_model_path, run_yolo, select_device
+)
+from utils.cache import LRUCache, file_digest
 
 DAMAGE_CLASS_MAP = {
 0: "car-part-crack",
@@ -17,12 +21,46 @@ DAMAGE_CLASS_MAP = {
 10: "flat-tire",
 }
 
+# Detection results keyed by (model_id, image content digest), so re-submitting
+# the same image skips inference entirely.
+_result_cache = LRUCache(maxsize=256)
+
+def round_confidences(conf: np.ndarray) -> list:
+    """
+    Rounds model confidences to 2 decimals as plain Python floats.
+
+    ``tolist()`` widens the float32 scores once; rounding after that gives
+    exactly ``round(x, 2)`` (e.g. 0.87), whereas rounding in float32 and then
+    widening would leak values like 0.8700000047683716 into the report.
+
+    Args:
+        conf (np.ndarray): The per-box confidences.
+
+    Returns:
+        list: The rounded confidences.
+    """
+    return [round(c, 2) for c in conf.tolist()]
+
 class DamageDetectionAgent:
     """
     An agent that uses a fine-tuned YOLOv8 model to detect and classify
     vehicle damage from an image.
     """
 
+    # One instance, and one copy of the weights, per model path per process
+    _instances = {}
+    _instances_lock = threading.RLock()
+
+    def __new__(cls, model_path='models/damage.pt'):
+        key = resolve_model_path(str(model_path))
+        with cls._instances_lock:
+            instance = cls._instances.get(key)
+            if instance is None:
+                instance = super().__new__(cls)
+                instance._initialized = False
+                cls._instances[key] = instance
+            return instance
+
     def __init__(self, model_path='models/damage.pt'):
         """
         Initializes the agent by loading the YOLO model.
@@ -30,41 +68,39 @@ class DamageDetectionAgent:
         Args:
             model_path (str): The path to the pre-trained YOLO model file.
         """
-        print("Initializing DamageDetectionAgent...")
-        self.device = 'cpu'
-        print(f"Using device: {self.device}")
-        try:
-            # Resolve model path relative to the project root if needed
-            project_root = Path(__file__).resolve().parents[1]
-            provided_path = Path(model_path).expanduser()
-
-            if provided_path.is_absolute():
-                resolved_path = provided_path
-            else:
-                # Prefer project-root relative first
-                resolved_path = (project_root / provided_path).resolve()
-
-            # If the resolved path doesn't exist, try models/ directory fallback
-            if not resolved_path.exists():
-                models_fallback = (project_root / 'models' / provided_path.name)
-                if models_fallback.exists():
-                    resolved_path = models_fallback
-
-            print(f"Loading damage model from: {resolved_path}")
-
-            self.model = YOLO(str(resolved_path))
-            self.model.to(self.device)
-            print("Damage detection model loaded successfully.")
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            self.model = None
-
-    def process(self, image_path: str):
+        with self._instances_lock:
+            # Already loaded by an earlier construction with the same model path
+            if self._initialized:
+                return
+            print("Initializing DamageDetectionAgent...")
+            self.device = select_device()
+            print(f"Using device: {self.device}")
+            try:
+                resolved_path = resolve_model_path(str(model_path))
+
+                print(f"Loading damage model from: {resolved_path}")
+
+                self.model = load_yolo(resolved_path, self.device)
+                self.model_id = str(resolved_path)
+                self.async_model = load_async_detector(resolved_path, DAMAGE_CLASS_MAP, self.device)
+                print("Damage detection model loaded successfully.")
+            except Exception as e:
+                print(f"Error loading model: {e}")
+                self.model = None
+                self.async_model = None
+            self._initialized = True
+
+    def process(self, image_path: str, preproc_tensor=None, orig_shape=None):
         """
         Processes an image to detect damage using the YOLO model.
 
         Args:
             image_path (str): The path to the image file.
+            preproc_tensor (torch.Tensor, optional): The letterboxed input tensor
+                from ``preprocess_once``. When given, the model is fed this tensor
+                and the image file is not decoded again.
+            orig_shape (tuple, optional): The original ``(height, width)`` of the
+                image, required with ``preproc_tensor``.
 
         Returns:
             dict: A dictionary containing the damage detection results, adhering
@@ -80,37 +116,57 @@ class DamageDetectionAgent:
                 "processing_time_ms": 0
             }
 
+        # --- Serve repeated images from the content-hash cache ---
+        cache_key = None
+        if image_path:
+            try:
+                cache_key = (self.model_id, file_digest(image_path))
+            except OSError:
+                pass
+        cached = _result_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            detections, total_damage_area = cached
+            print(f"--- Damage Detection served from cache, found {len(detections)} damages ---")
+            return {
+                "detections": [dict(d, bbox=list(d["bbox"])) for d in detections],
+                "total_damage_area": total_damage_area,
+                "processing_time_ms": (time.time() - start_time) * 1000
+            }
+
         # --- Real YOLO Model Inference ---
         try:
-            results = self.model(image_path, verbose=False) # verbose=False to reduce console spam
+            source = preproc_tensor if preproc_tensor is not None else image_path
+            results = run_yolo(self.model, source, self.device, self.async_model)
         except Exception as e:
             print(f"An error occurred during model inference: {e}")
             return {"detections": [], "total_damage_area": 0, "processing_time_ms": (time.time() - start_time) * 1000}
 
         detections = []
+        total_damage_area = 0
         # Assuming results[0] contains the detections for the first image
         if results and results[0]:
             boxes = results[0].boxes
-            for box in boxes:
-                # Extract bounding box coordinates [x1, y1, x2, y2]
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().tolist()
-                
-                # Extract confidence and class
-                confidence = float(box.conf[0].cpu().numpy())
-                class_id = int(box.cls[0].cpu().numpy())
-                
-                # Map class_id to damage_type string
-                damage_type = DAMAGE_CLASS_MAP.get(class_id, "unknown_damage")
-
-                detection = {
-                    "bbox": [x1, y1, x2, y2],
-                    "confidence": round(confidence, 2),
-                    "damage_type": damage_type
+            # One device->host transfer per field instead of three per box
+            xyxy = boxes_xyxy(results[0], preproc_tensor, orig_shape).cpu().numpy()
+            conf = round_confidences(boxes.conf.float().cpu().numpy())
+            cls = boxes.cls.cpu().numpy().astype(np.int32)
+
+            detections = [
+                {
+                    "bbox": xyxy[i].tolist(),
+                    "confidence": conf[i],
+                    "damage_type": DAMAGE_CLASS_MAP.get(int(cls[i]), "unknown_damage")
                 }
-                detections.append(detection)
+                for i in range(len(cls))
+            ]
 
-        # Mock the total damage area for now, as this is complex to calculate
-        total_damage_area = round(random.uniform(5.0, 25.0), 2) if detections else 0
+            # Total damaged area as a percentage of the image
+            image_h, image_w = orig_shape if preproc_tensor is not None else results[0].orig_shape
+            areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+            total_damage_area = round(min(float(areas.sum()) / (image_h * image_w) * 100, 100.0), 2)
+
+        if cache_key:
+            _result_cache.put(cache_key, ([dict(d, bbox=list(d["bbox"])) for d in detections], total_damage_area))
 
         end_time = time.time()
         processing_time_ms = (end_time - start_time) * 1000
@@ -122,6 +178,10 @@ class DamageDetectionAgent:
             "processing_time_ms": processing_time_ms
         }
 
+    async def aprocess(self, image_path: str, preproc_tensor=None, orig_shape=None):
+        """Runs ``process`` in a worker thread; inference releases the GIL, so other nodes keep running."""
+        return await asyncio.to_thread(self.process, image_path, preproc_tensor, orig_shape)
+
 # Example usage (for testing the agent in isolation)
 if __name__ == '__main__':
     # Make sure you have a model file named 'damage_detection_yolo.pt'
@@ -129,12 +189,13 @@ if __name__ == '__main__':
     try:
         agent = DamageDetectionAgent(model_path='../models/damage.pt')
         # Create a dummy image for testing if you don't have one
-        from PIL import Image
-        import numpy as np
+        import cv2
+        from orchestrator.preprocessing import preprocess_once
         dummy_image_path = "test_damage_image.jpg"
-        Image.fromarray(np.zeros((640, 640, 3), dtype=np.uint8)).save(dummy_image_path)
+        cv2.imwrite(dummy_image_path, np.zeros((640, 640, 3), dtype=np.uint8))
 
-        result = agent.process(dummy_image_path)
+        # Decode once with OpenCV, as the orchestrator does
+        result = agent.process(dummy_image_path, *preprocess_once(dummy_image_path))
         print("\nDamage Detection Result:")
         print(result)
         assert "detections" in result
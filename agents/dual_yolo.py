@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+class DualYOLO:
+    """
+    Runs the damage and part YOLO models concurrently on the same image.
+
+    The two models are independent until the IoU matching step, so running
+    them side by side brings the wall-clock cost of the pair down to roughly
+    that of the slower model. The inference backends release the GIL, so
+    running each call in a worker thread is enough to overlap them. The
+    threads come from the event loop's default executor, so concurrent
+    claims aren't capped by a pool of this class's own.
+
+    ``aprocess`` is also the seam for a jointly trained two-head model (shared
+    backbone, damage head and parts head): such a model can replace the two
+    agent calls here without changing any caller.
+    """
+
+    def __init__(self, detection_agent, part_agent):
+        """
+        Initializes the wrapper around two already-loaded agents.
+
+        Args:
+            detection_agent (DamageDetectionAgent): The damage detection agent.
+            part_agent (PartIdentificationAgent): The part identification agent.
+        """
+        print("Initializing DualYOLO...")
+        self.detection_agent = detection_agent
+        self.part_agent = part_agent
+
+    def _detect_parts(self, image_path: str, preproc_tensor=None, orig_shape=None):
+        # A part model failure only loses the part matches, not the claim
+        try:
+            return self.part_agent.detect_parts(image_path, preproc_tensor, orig_shape)
+        except Exception as e:
+            print(f"An error occurred during part detection inference: {e}")
+            return None
+
+    async def aprocess(self, image_path: str, preproc_tensor=None, orig_shape=None):
+        """
+        Runs damage detection and part detection in parallel.
+
+        Args:
+            image_path (str): The path to the image file.
+            preproc_tensor (torch.Tensor, optional): The shared letterboxed input tensor.
+            orig_shape (tuple, optional): The original ``(height, width)`` of the image.
+
+        Returns:
+            tuple: ``(damage_results, part_results)`` where ``damage_results`` is
+            the damage agent's output dict and ``part_results`` is the list of
+            detected parts, or None if part inference failed.
+        """
+        start_time = time.time()
+
+        damage_results, part_results = await asyncio.gather(
+            asyncio.to_thread(self.detection_agent.process, image_path, preproc_tensor, orig_shape),
+            asyncio.to_thread(self._detect_parts, image_path, preproc_tensor, orig_shape),
+        )
+
+        print(f"--- DualYOLO complete in {(time.time() - start_time) * 1000:.0f}ms ---")
+        return damage_results, part_results
+
+    def process(self, image_path: str, preproc_tensor=None, orig_shape=None):
+        """Runs ``aprocess`` to completion, for callers outside an event loop."""
+        return asyncio.run(self.aprocess(image_path, preproc_tensor, orig_shape))
@@ -1,3 +1,5 @@
+import asyncio
+import os
 import time
 import random
 import numpy as np
@@ -14,8 +16,9 @@ class MockImageQualityAgent:
     def __init__(self):
         """Initializes the agent."""
         print("Initializing MockImageQualityAgent...")
-        # Simulate model loading time
-        time.sleep(0.1)
+        # Simulate model loading time (opt-in, so tests and CI don't pay for it)
+        if os.getenv('MOCK_AGENT_SIMULATE_LATENCY', '0') == '1':
+            time.sleep(0.1)
 
     def process(self, image_path: str):
         """
@@ -31,7 +34,8 @@ class MockImageQualityAgent:
         start_time = time.time()
 
         # Simulate processing delay
-        time.sleep(random.uniform(0.2, 0.5))
+        if os.getenv('MOCK_AGENT_SIMULATE_LATENCY', '0') == '1':
+            time.sleep(random.uniform(0.2, 0.5))
 
         # --- Mock Logic ---
         # We'll use the filename to simulate different quality scenarios.
@@ -71,6 +75,10 @@ class MockImageQualityAgent:
             "processing_time_ms": processing_time_ms
         }
 
+    async def aprocess(self, image_path: str):
+        """Runs ``process`` in a worker thread so the event loop isn't blocked."""
+        return await asyncio.to_thread(self.process, image_path)
+
 # Example usage (for testing the agent in isolation)
 if __name__ == '__main__':
     agent = MockImageQualityAgent()
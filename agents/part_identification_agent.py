@@ -1,8 +1,13 @@
+import asyncio
+import threading
 import time
 import random
-from pathlib import Path
-from ultralytics import YOLO
-from utils.geometry import calculate_iou
+import numpy as np
+from utils.yolo_backend import (
+    load_yolo, load_async_detector, boxes_xyxy, resolve_model_path, run_yolo, select_device
+)
+from utils.cache import LRUCache, file_digest
+from utils.geometry import calculate_iou_matrix
 
 # IMPORTANT: You must update this map to match your part detection model's classes.
 # The key is the class index (0, 1, 2, ...) and the value is the part name.
@@ -32,6 +37,10 @@ PART_CLASS_MAP = {
   22: "wheel",
 }
 
+# Raw part detections keyed by (model_id, image content digest), so
+# re-submitting the same image skips inference entirely.
+_parts_cache = LRUCache(maxsize=256)
+
 class PartIdentificationAgent:
     """
     An agent that uses a YOLO model to identify car parts and then maps
@@ -39,38 +48,92 @@ class PartIdentificationAgent:
     """
     IOU_THRESHOLD = 0.01 # If overlap is less than 10%, we don't associate them.
 
+    # One instance, and one copy of the weights, per model path per process
+    _instances = {}
+    _instances_lock = threading.RLock()
+
+    def __new__(cls, model_path='models/parts.pt'):
+        key = resolve_model_path(str(model_path))
+        with cls._instances_lock:
+            instance = cls._instances.get(key)
+            if instance is None:
+                instance = super().__new__(cls)
+                instance._initialized = False
+                cls._instances[key] = instance
+            return instance
+
     def __init__(self, model_path='models/parts.pt'):
         """
         Initializes the agent by loading the part detection YOLO model.
         """
-        print("Initializing PartIdentificationAgent...")
-        self.device = 'cpu'
-        print(f"Using device: {self.device}")
-        try:
-            # Resolve model path relative to the project root if needed
-            project_root = Path(__file__).resolve().parents[1]
-            provided_path = Path(model_path).expanduser()
-
-            if provided_path.is_absolute():
-                resolved_path = provided_path
-            else:
-                resolved_path = (project_root / provided_path).resolve()
-
-            if not resolved_path.exists():
-                models_fallback = (project_root / 'models' / provided_path.name)
-                if models_fallback.exists():
-                    resolved_path = models_fallback
-
-            print(f"Loading parts model from: {resolved_path}")
-
-            self.model = YOLO(str(resolved_path))
-            self.model.to(self.device)
-            print("Part detection model loaded successfully.")
-        except Exception as e:
-            print(f"Error loading part detection model: {e}")
-            self.model = None
-
-    def process(self, image_path: str, damage_detections: list):
+        with self._instances_lock:
+            # Already loaded by an earlier construction with the same model path
+            if self._initialized:
+                return
+            print("Initializing PartIdentificationAgent...")
+            self.device = select_device()
+            print(f"Using device: {self.device}")
+            try:
+                resolved_path = resolve_model_path(str(model_path))
+
+                print(f"Loading parts model from: {resolved_path}")
+
+                self.model = load_yolo(resolved_path, self.device)
+                self.model_id = str(resolved_path)
+                self.async_model = load_async_detector(resolved_path, PART_CLASS_MAP, self.device)
+                print("Part detection model loaded successfully.")
+            except Exception as e:
+                print(f"Error loading part detection model: {e}")
+                self.model = None
+                self.async_model = None
+            self._initialized = True
+
+    def detect_parts(self, image_path: str, preproc_tensor=None, orig_shape=None):
+        """
+        Runs the part detection model on an image.
+
+        Args:
+            image_path (str): The path to the image file.
+            preproc_tensor (torch.Tensor, optional): The letterboxed input tensor
+                shared with the damage detection agent.
+            orig_shape (tuple, optional): The original ``(height, width)`` of the
+                image, required with ``preproc_tensor``.
+
+        Returns:
+            list: Detected parts, each with a "bbox" and a "class_id".
+        """
+        if not self.model:
+            return []
+
+        cache_key = None
+        if image_path:
+            try:
+                cache_key = (self.model_id, file_digest(image_path))
+            except OSError:
+                pass
+        cached = _parts_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return [dict(p, bbox=list(p["bbox"])) for p in cached]
+
+        source = preproc_tensor if preproc_tensor is not None else image_path
+        part_results = run_yolo(self.model, source, self.device, self.async_model)
+
+        detected_parts = []
+        if part_results and part_results[0]:
+            # One device->host transfer per field instead of two per box
+            xyxy = boxes_xyxy(part_results[0], preproc_tensor, orig_shape).cpu().numpy()
+            cls = part_results[0].boxes.cls.cpu().numpy().astype(np.int32)
+            detected_parts = [
+                {"bbox": xyxy[i].tolist(), "class_id": int(cls[i])}
+                for i in range(len(cls))
+            ]
+
+        if cache_key:
+            _parts_cache.put(cache_key, [dict(p, bbox=list(p["bbox"])) for p in detected_parts])
+        return detected_parts
+
+    def process(self, image_path: str, damage_detections: list, preproc_tensor=None, orig_shape=None,
+                detected_parts=None):
         """
         Identifies car parts in the image and associates them with the provided
         damage detections.
@@ -78,6 +141,12 @@ class PartIdentificationAgent:
         Args:
             image_path (str): The path to the image file.
             damage_detections (list): A list of damage detection dictionaries.
+            preproc_tensor (torch.Tensor, optional): The letterboxed input tensor
+                shared with the damage detection agent.
+            orig_shape (tuple, optional): The original ``(height, width)`` of the
+                image, required with ``preproc_tensor``.
+            detected_parts (list, optional): Parts already detected by
+                ``detect_parts`` (e.g. via ``DualYOLO``). Skips inference when given.
 
         Returns:
             dict: A dictionary containing the identified damaged parts.
@@ -92,44 +161,41 @@ class PartIdentificationAgent:
             }
 
         # --- 1. Detect all car parts in the image ---
-        try:
-            part_results = self.model(image_path, verbose=False)
-        except Exception as e:
-            print(f"An error occurred during part detection inference: {e}")
-            return {"damaged_parts": [], "processing_time_ms": (time.time() - start_time) * 1000}
-
-        detected_parts = []
-        if part_results and part_results[0]:
-            for box in part_results[0].boxes:
-                detected_parts.append({
-                    "bbox": box.xyxy[0].cpu().numpy().tolist(),
-                    "class_id": int(box.cls[0].cpu().numpy())
-                })
+        if detected_parts is None:
+            try:
+                detected_parts = self.detect_parts(image_path, preproc_tensor, orig_shape)
+            except Exception as e:
+                print(f"An error occurred during part detection inference: {e}")
+                return {"damaged_parts": [], "processing_time_ms": (time.time() - start_time) * 1000}
 
         # --- 2. Find the best part match for each damage ---
         damaged_parts = []
-        for damage in damage_detections:
-            best_iou = 0
-            best_part_match = None
-
-            for part in detected_parts:
-                iou = calculate_iou(damage['bbox'], part['bbox'])
-                if iou > best_iou:
-                    best_iou = iou
-                    best_part_match = part
-            
-            # If a sufficiently overlapping part was found, create the record
-            if best_part_match and best_iou > self.IOU_THRESHOLD:
-                part_name = PART_CLASS_MAP.get(best_part_match['class_id'], "unknown_part")
+        if detected_parts:
+            iou = calculate_iou_matrix(
+                [d['bbox'] for d in damage_detections],
+                [p['bbox'] for p in detected_parts],
+            )
+            best_idx = iou.argmax(axis=1)
+            best_iou = iou.max(axis=1)
+
+            # Skip the per-damage loop entirely when nothing overlaps any part
+            if best_iou.max() > self.IOU_THRESHOLD:
+                for damage, part_idx, score in zip(damage_detections, best_idx, best_iou):
+                    # Only create a record if a sufficiently overlapping part was found
+                    if score <= self.IOU_THRESHOLD:
+                        continue
+
+                    best_part_match = detected_parts[part_idx]
+                    part_name = PART_CLASS_MAP.get(best_part_match['class_id'], "unknown_part")
                 
-                part_data = {
-                    "part_name": part_name,
-                    "part_id": f"{part_name.upper()[:4]}-001", # Mock ID
-                    "damage_percentage": random.randint(15, 60), # Mocked for now
-                    "bbox": damage['bbox'], # Use the damage bbox for annotation
-                    "damage_type": damage.get("damage_type", "unknown")
-                }
-                damaged_parts.append(part_data)
+                    part_data = {
+                        "part_name": part_name,
+                        "part_id": f"{part_name.upper()[:4]}-001", # Mock ID
+                        "damage_percentage": random.randint(15, 60), # Mocked for now
+                        "bbox": damage['bbox'], # Use the damage bbox for annotation
+                        "damage_type": damage.get("damage_type", "unknown")
+                    }
+                    damaged_parts.append(part_data)
 
         end_time = time.time()
         processing_time_ms = (end_time - start_time) * 1000
@@ -140,6 +206,11 @@ class PartIdentificationAgent:
             "processing_time_ms": processing_time_ms
         }
 
+    async def aprocess(self, image_path: str, damage_detections: list, preproc_tensor=None, orig_shape=None,
+                      detected_parts=None):
+        """Runs ``process`` in a worker thread; inference releases the GIL, so other nodes keep running."""
+        return await asyncio.to_thread(self.process, image_path, damage_detections, preproc_tensor, orig_shape, detected_parts)
+
 # Example usage
 if __name__ == '__main__':
     # This test requires both a model and a test image.
@@ -153,12 +224,13 @@ if __name__ == '__main__':
         ]
         
         # Create a dummy image for testing
-        from PIL import Image
-        import numpy as np
+        import cv2
+        from orchestrator.preprocessing import preprocess_once
         dummy_image_path = "test_parts_image.jpg"
-        Image.fromarray(np.zeros((640, 640, 3), dtype=np.uint8)).save(dummy_image_path)
+        cv2.imwrite(dummy_image_path, np.zeros((640, 640, 3), dtype=np.uint8))
 
-        result = agent.process(dummy_image_path, mock_detections)
+        # Decode once with OpenCV, as the orchestrator does
+        result = agent.process(dummy_image_path, mock_detections, *preprocess_once(dummy_image_path))
         print("\nPart Identification Result:")
         print(result)
     except Exception as e:
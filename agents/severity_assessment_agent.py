@@ -1,6 +1,22 @@
+import asyncio
+import os
 import time
 import random
-from utils.config import SEVERITY_RULES, DAMAGE_TO_SEVERITY_MAPPING
+import numpy as np
+from utils.config import SEVERITY_RULES, DAMAGE_TO_SEVERITY_MAPPING, DAMAGE_TYPES, SEVERITY_LEVELS
+
+# --- Precomputed severity lookup tables ---
+_SEVERITY_LEVELS = {s: i + 1 for i, s in enumerate(SEVERITY_LEVELS)}
+# Reverse lookup, indexed by level (0 is never the max of a non-empty list)
+_LEVEL_TO_SEVERITY = ("moderate", *SEVERITY_LEVELS)
+_DAMAGE_INDEX = {d: i for i, d in enumerate(DAMAGE_TYPES)}
+# Damage types outside DAMAGE_TYPES fall into the trailing "moderate" slot
+_UNKNOWN_DAMAGE = len(DAMAGE_TYPES)
+_DAMAGE_LEVELS = np.array(
+    [_SEVERITY_LEVELS[DAMAGE_TO_SEVERITY_MAPPING.get(d, "moderate")] for d in DAMAGE_TYPES]
+    + [_SEVERITY_LEVELS["moderate"]],
+    dtype=np.int8,
+)
 
 class MockSeverityAssessmentAgent:
     """
@@ -13,8 +29,9 @@ class MockSeverityAssessmentAgent:
     def __init__(self):
         """Initializes the agent."""
         print("Initializing MockSeverityAssessmentAgent...")
-        # Simulate model loading time
-        time.sleep(0.1)
+        # Simulate model loading time (opt-in, so tests and CI don't pay for it)
+        if os.getenv('MOCK_AGENT_SIMULATE_LATENCY', '0') == '1':
+            time.sleep(0.1)
 
     def process(self, damaged_parts_data: list):
         """
@@ -31,7 +48,8 @@ class MockSeverityAssessmentAgent:
         start_time = time.time()
 
         # Simulate processing delay
-        time.sleep(random.uniform(0.4, 0.7))
+        if os.getenv('MOCK_AGENT_SIMULATE_LATENCY', '0') == '1':
+            time.sleep(random.uniform(0.4, 0.7))
 
         if not damaged_parts_data:
             return {
@@ -47,29 +65,26 @@ class MockSeverityAssessmentAgent:
         # Determine overall severity based on the most severe damage type found.
         # In a real system, this would be a more complex rule engine or a predictive model.
         
-        severity_levels = {"minor": 1, "moderate": 2, "major": 3, "severe": 4}
-        max_severity_level = 0
-        
-        for part in damaged_parts_data:
-            damage_type = part.get("damage_type", "dent")
-            severity_str = DAMAGE_TO_SEVERITY_MAPPING.get(damage_type, "moderate")
-            level = severity_levels.get(severity_str, 2)
-            if level > max_severity_level:
-                max_severity_level = level
+        idxs = np.fromiter(
+            (_DAMAGE_INDEX.get(part.get("damage_type", "dent"), _UNKNOWN_DAMAGE) for part in damaged_parts_data),
+            dtype=np.int32,
+            count=len(damaged_parts_data),
+        )
+        max_severity_level = int(_DAMAGE_LEVELS[idxs].max())
 
         # Map the highest detected level back to a string
-        overall_severity = next(
-            (k for k, v in severity_levels.items() if v == max_severity_level), "moderate"
-        )
+        overall_severity = _LEVEL_TO_SEVERITY[max_severity_level]
 
         # Use the severity rules from our config to get cost and time
         assessment_rules = SEVERITY_RULES.get(overall_severity, SEVERITY_RULES["moderate"])
-        cost_range = assessment_rules["cost_range"]
+        base_low, base_high = assessment_rules["cost_range"]
         repair_days = assessment_rules["repair_days"]
 
-        # Add some random jitter to the cost estimate
-        cost_range[0] = int(cost_range[0] * random.uniform(0.9, 1.1))
-        cost_range[1] = int(cost_range[1] * random.uniform(1.0, 1.2))
+        # Add some random jitter to the cost estimate (the config itself is read-only)
+        cost_range = [
+            int(base_low * random.uniform(0.9, 1.1)),
+            int(base_high * random.uniform(1.0, 1.2))
+        ]
 
         # Generate a final severity score out of 10
         severity_score = round(max_severity_level * 2.5 - random.uniform(0, 1), 1)
@@ -95,6 +110,10 @@ class MockSeverityAssessmentAgent:
             "processing_time_ms": processing_time_ms
         }
 
+    async def aprocess(self, damaged_parts_data: list):
+        """Runs ``process`` in a worker thread so the event loop isn't blocked."""
+        return await asyncio.to_thread(self.process, damaged_parts_data)
+
 # Example usage (for testing the agent in isolation)
 if __name__ == '__main__':
     agent = MockSeverityAssessmentAgent()
@@ -0,0 +1,37 @@
+# benchmarks/bench_iou.py
+"""
+Times the matrix IoU entry points on random pixel boxes.
+
+Run from the project root with ``python -m benchmarks.bench_iou``.
+"""
+import timeit
+import numpy as np
+from utils.geometry import calculate_iou_matrix, calculate_iou_matrix_tiled, calculate_iou_self
+
+
+def random_boxes(n: int, rng) -> np.ndarray:
+    """Returns ``n`` float32 boxes of up to 300x300 pixels inside a 2300x2300 frame."""
+    xy = rng.random((n, 2)) * 2000
+    return np.hstack([xy, xy + rng.random((n, 2)) * 300]).astype(np.float32)
+
+
+def best_ms(fn, number: int = 3, repeat: int = 5) -> float:
+    """Returns the best per-call time of ``fn`` in milliseconds."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'N':>6} {'matrix(A, A)':>14} {'self(A)':>10} {'tiled(A, A)':>13}")
+    for n in (300, 1000, 3000):
+        boxes = random_boxes(n, rng)
+        # The self-IoU must agree exactly with the full matrix it replaces
+        assert np.array_equal(calculate_iou_self(boxes), calculate_iou_matrix(boxes, boxes))
+        print(f"{n:>6} "
+              f"{best_ms(lambda: calculate_iou_matrix(boxes, boxes)):>11.2f} ms "
+              f"{best_ms(lambda: calculate_iou_self(boxes)):>7.2f} ms "
+              f"{best_ms(lambda: calculate_iou_matrix_tiled(boxes, boxes)):>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,23 @@
-from ui.app import demo
 import os
+import tempfile
+
+# Let the asynchronous OpenVINO request pool (OV_ASYNC_INFERENCE=1) reuse its
+# compiled model blobs across restarts. The default YOLO(ov_dir) load path
+# compiles through Ultralytics' own ov.Core() and doesn't read this. It must
+# be set before the agents, and with them the inference backends, are created.
+os.environ.setdefault("OPENVINO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ov_cache"))
+
+import torch
+
+# The damage and part models run side by side, so give each half the cores'
+# intra-op threads instead of letting both oversubscribe the whole machine.
+torch.set_num_threads(max(1, (os.cpu_count() or 1) // 2))
+
+from ui.app import demo
+from agents.damage_detection_agent import DamageDetectionAgent
+from agents.part_identification_agent import PartIdentificationAgent
+from utils.yolo_backend import warmup_yolo
+from orchestrator.damage_assessment_graph import get_graph
 
 def main():
     """
@@ -8,6 +26,22 @@ def main():
     # Create a dummy directory for uploads if it doesn't exist, as Gradio might need it.
     if not os.path.exists("uploads"):
         os.makedirs("uploads")
+
+    # Load both YOLO models and run one warm-up inference each before serving,
+    # so the first request doesn't pay for weight loading or backend
+    # compilation. The agents are process-wide singletons, so the graph's
+    # callbacks reuse these same instances.
+    print("Preloading YOLO models...")
+    for agent in (DamageDetectionAgent(), PartIdentificationAgent()):
+        if not agent.model:
+            continue
+        try:
+            warmup_yolo(agent.model, agent.device, agent.async_model)
+        except Exception as e:
+            print(f"Model warm-up failed, continuing without it: {e}")
+
+    # Build the graph up front too, instead of on the first request.
+    get_graph()
         
     print("Launching Vehicle Damage Assessment Dashboard...")
     # The launch() method starts the web server.
@@ -16,4 +50,4 @@ def main():
     demo.launch(server_name="0.0.0.0", server_port=7860, debug=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
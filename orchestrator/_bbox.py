@@ -0,0 +1,38 @@
+# orchestrator/_bbox.py
+import numpy as np
+from utils.geometry import calculate_iou_all_pairs
+
+
+def pair_iou(a, b) -> np.ndarray:
+    """
+    Computes the IoU of every box in ``a`` against every box in ``b``.
+
+    Delegates to ``utils.geometry.calculate_iou_all_pairs``, whose parallel
+    Numba kernel is compiled eagerly at import, so no call from the async
+    graph nodes pays JIT latency on the event loop.
+
+    Args:
+        a (array-like): Boxes of shape (N, 4) in [x1, y1, x2, y2] format.
+        b (array-like): Boxes of shape (M, 4) in [x1, y1, x2, y2] format.
+
+    Returns:
+        np.ndarray: The (N, M) float64 IoU matrix.
+    """
+    return calculate_iou_all_pairs(a, b)
+
+
+def best_match(a, b):
+    """
+    Finds, for every box in ``a``, the box in ``b`` it overlaps most.
+
+    Args:
+        a (array-like): Boxes of shape (N, 4) in [x1, y1, x2, y2] format.
+        b (array-like): Boxes of shape (M, 4), with M > 0.
+
+    Returns:
+        tuple: ``(indices, ious)``, two length-N arrays holding the index of
+        the best-matching box in ``b`` and its IoU.
+    """
+    iou = pair_iou(a, b)
+    best_idx = iou.argmax(axis=1)
+    return best_idx, iou[np.arange(iou.shape[0]), best_idx]
@@ -0,0 +1,30 @@
+import asyncio
+import uuid
+from .graph_state import GraphState
+from .damage_assessment_graph import get_graph
+
+def _init_state(image_path: str, claim_id: str = None) -> GraphState:
+    """Creates the initial graph state for a claim on a single image, with a fresh claim id unless one is given."""
+    return GraphState(
+        claim_id=claim_id or f"CLM-{str(uuid.uuid4())[:8].upper()}", image_path=image_path, processing_log=[],
+        error_message=None, preprocessed_image=None, detected_parts=None,
+        quality_check_result=None, damage_detection_result=None,
+        part_identification_result=None, severity_assessment_result=None, final_report=None
+    )
+
+async def process_batch(image_paths: list) -> list:
+    """
+    Assesses several claims concurrently, one claim per image.
+
+    All claims run through the graph at once, so one claim's model inference
+    overlaps with the other claims' agent work instead of queuing behind it.
+
+    Args:
+        image_paths (list): The paths to the claim images.
+
+    Returns:
+        list: The final graph state of each claim, in the order of ``image_paths``.
+    """
+    # A cold first call loads and exports both models; keep that off the event loop
+    graph = await asyncio.to_thread(get_graph)
+    return await asyncio.gather(*(graph.ainvoke(_init_state(path)) for path in image_paths))
@@ -1,116 +1,201 @@
-import time
-from langgraph.graph import StateGraph, END
-from .graph_state import GraphState
+import asyncio
+import functools
+import os
+from types import SimpleNamespace
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
+from .graph_state import GraphState, _RuntimeState
+from .preprocessing import preprocess_once
+from ._bbox import best_match
 
 # Import the mock agents
 from agents.image_quality_agent import MockImageQualityAgent
 from agents.damage_detection_agent import DamageDetectionAgent
 from agents.part_identification_agent import PartIdentificationAgent
+from agents.dual_yolo import DualYOLO
 from agents.severity_assessment_agent import MockSeverityAssessmentAgent
+from utils.config import DAMAGE_TO_SEVERITY_MAPPING, SEVERITY_LEVELS
 
 # --- 1. Instantiate Agents ---
-# Create a single instance of each agent to be used throughout the graph.
-quality_agent = MockImageQualityAgent()
-detection_agent = DamageDetectionAgent()
-part_agent = PartIdentificationAgent()
-severity_agent = MockSeverityAssessmentAgent()
+# Create a single instance of each agent to be used throughout the graph. This
+# happens on first use rather than at import, so importing the module (e.g. for
+# GraphState) doesn't load the models.
+@functools.cache
+def _get_agents() -> SimpleNamespace:
+    """Creates the agents once per process."""
+    detection_agent = DamageDetectionAgent()
+    part_agent = PartIdentificationAgent()
+    return SimpleNamespace(
+        quality=MockImageQualityAgent(),
+        detection=detection_agent,
+        part=part_agent,
+        severity=MockSeverityAssessmentAgent(),
+        # Runs the damage and part models side by side on the shared input.
+        dual_yolo=DualYOLO(detection_agent, part_agent),
+    )
+
+# Integer severity codes stored alongside the severity name in annotations
+_SEVERITY_CODES = {s: i for i, s in enumerate(SEVERITY_LEVELS)}
+
+# Minimum IoU for a damaged part's box to count as the same damage as a detection
+BBOX_MATCH_IOU = 0.5
 
 # --- 2. Define Graph Nodes ---
 # Each node in the graph is a function that takes the current state, performs an action,
-# and returns a dictionary to update the state.
+# and returns a dictionary with only the state fields it updates. Agent nodes are async
+# and run the blocking agent code in worker threads, so the graph must be driven with
+# ainvoke()/astream().
 
-def run_quality_check(state: GraphState) -> GraphState:
+def dispatch_initial_checks(state: GraphState) -> list:
+    """Fans the image out to the quality check and damage detection in parallel."""
+    payload = {"claim_id": state['claim_id'], "image_path": state['image_path']}
+    return [Send("quality_check", payload), Send("damage_detection", payload)]
+
+async def run_quality_check(state: GraphState) -> dict:
     """Runs the Image Quality Agent and updates the state."""
-    state['processing_log'].append("Step 1: Assessing Image Quality...")
     image_path = state['image_path']
     
-    result = quality_agent.process(image_path)
+    result = await _get_agents().quality.aprocess(image_path)
     
-    state['quality_check_result'] = result
-    return state
+    return {
+        "processing_log": ["Step 1: Assessing Image Quality..."],
+        "quality_check_result": result
+    }
 
-def run_damage_detection(state: GraphState) -> GraphState:
+async def run_damage_detection(state: GraphState) -> dict:
     """Runs the Damage Detection Agent and updates the state."""
-    state['processing_log'].append("Step 2: Detecting Damage...")
     image_path = state['image_path']
+
+    # Decode and letterbox once; the part agent reuses the same tensor.
+    preprocessed = await asyncio.to_thread(preprocess_once, image_path)
+
+    # The part model runs concurrently; its raw detections are kept for step 3.
+    result, detected_parts = await _get_agents().dual_yolo.aprocess(image_path, *(preprocessed or ()))
     
-    result = detection_agent.process(image_path)
-    
-    state['damage_detection_result'] = result
-    return state
+    return {
+        "processing_log": ["Step 2: Detecting Damage..."],
+        "preprocessed_image": preprocessed,
+        "damage_detection_result": result,
+        "detected_parts": detected_parts
+    }
+
+def join_initial_checks(state: GraphState) -> dict:
+    """Waits for both parallel branches; routing happens on its outgoing edge."""
+    return {}
 
-def run_part_identification(state: GraphState) -> GraphState:
+async def run_part_identification(state: GraphState) -> dict:
     """Runs the Part Identification Agent and updates the state."""
-    state['processing_log'].append("Step 3: Identifying Damaged Parts...")
     image_path = state['image_path']
     damage_detections = state['damage_detection_result']['detections']
     
-    result = part_agent.process(image_path, damage_detections)
+    preprocessed = state.get('preprocessed_image')
+
+    result = await _get_agents().part.aprocess(
+        image_path, damage_detections, *(preprocessed or ()),
+        detected_parts=state.get('detected_parts')
+    )
     
-    state['part_identification_result'] = result
-    return state
+    return {
+        "processing_log": ["Step 3: Identifying Damaged Parts..."],
+        "part_identification_result": result
+    }
 
-def run_severity_assessment(state: GraphState) -> GraphState:
+async def run_severity_assessment(state: GraphState) -> dict:
     """Runs the Severity Assessment Agent and updates the state."""
-    state['processing_log'].append("Step 4: Assessing Severity...")
     damaged_parts = state['part_identification_result']['damaged_parts']
     
-    result = severity_agent.process(damaged_parts)
+    result = await _get_agents().severity.aprocess(damaged_parts)
     
-    state['severity_assessment_result'] = result
-    return state
+    return {
+        "processing_log": ["Step 4: Assessing Severity..."],
+        "severity_assessment_result": result
+    }
 
-def compile_final_report(state: GraphState) -> GraphState:
+async def compile_final_report(state: GraphState) -> dict:
     """Compiles the final assessment report from all agent outputs."""
-    state['processing_log'].append("Step 5: Compiling Final Report...")
-    time.sleep(0.5) # Simulate report generation time
+    if os.getenv('MOCK_AGENT_SIMULATE_LATENCY', '0') == '1':
+        await asyncio.sleep(0.5) # Simulate report generation time
+
+    # Read everything the report needs through one slotted copy of the state
+    rs = _RuntimeState.from_state(state)
+    # basename handles OS-native separators, unlike splitting on '/'
+    image_id = os.path.basename(rs.image_path)
     
-    # Handle the case where the image was rejected
-    if not state['quality_check_result']['processable']:
-        state['error_message'] = "Image quality is too low to process."
-        state['final_report'] = {
-            "claim_id": state['claim_id'],
-            "assessment_result": {
-                "quality_check": {
-                    "passed": False,
-                    "issues": state['quality_check_result']['issues']
+    # Handle the case where the image was rejected. Damage detection ran in
+    # parallel with the quality check, but its output is discarded here.
+    if not rs.quality_check_result['processable']:
+        return {
+            "processing_log": ["Step 5: Compiling Final Report...", "Process Halted: Image Rejected."],
+            "error_message": "Image quality is too low to process.",
+            "final_report": {
+                "claim_id": rs.claim_id,
+                "assessment_result": {
+                    "quality_check": {
+                        "passed": False,
+                        "issues": rs.quality_check_result['issues']
+                    }
                 }
             }
         }
-        state['processing_log'].append("Process Halted: Image Rejected.")
-        return state
 
     # Compile the full success report
-    quality_res = state['quality_check_result']
-    damage_res = state['damage_detection_result']
-    part_res = state['part_identification_result']
-    severity_res = state['severity_assessment_result']
+    quality_res = rs.quality_check_result
+    damage_res = rs.damage_detection_result
+    part_res = rs.part_identification_result
+    severity_res = rs.severity_assessment_result
 
-    # Create the final annotations by merging part and damage info
+    detections = damage_res['detections']
+    damaged_parts = part_res['damaged_parts']
+    num_detections = len(detections)
+
+    confidence_score = 0.0
+    if num_detections:
+        confidence_score = round(sum(d['confidence'] for d in detections) / num_detections, 2)
+
+    # Without damaged parts there is nothing to merge, so skip the lookup and
+    # annotation building entirely
     annotations = []
-    for part in part_res['damaged_parts']:
-        annotations.append({
-            "damage_type": part['damage_type'],
-            "part": part['part_name'],
-            "bbox": part['bbox'],
-            "confidence": next((d['confidence'] for d in damage_res['detections'] if d['bbox'] == part['bbox']), 0.9),
-            "severity": DAMAGE_TO_SEVERITY_MAPPING.get(part['damage_type'], "moderate")
-        })
+    if damaged_parts:
+        # Match each damaged part back to its source detection by IoU. Parts
+        # currently carry the damage bbox (IoU 1.0), but this also holds up
+        # once part boxes are refined. Unmatched parts keep the 0.9 default.
+        confidences = [0.9] * len(damaged_parts)
+        if num_detections:
+            best_idx, best_iou = best_match(
+                [p['bbox'] for p in damaged_parts], [d['bbox'] for d in detections]
+            )
+            for k, (idx, iou) in enumerate(zip(best_idx.tolist(), best_iou.tolist())):
+                if iou >= BBOX_MATCH_IOU:
+                    confidences[k] = detections[idx]['confidence']
+
+        # Create the final annotations by merging part and damage info
+        annotations = []
+        for part, confidence in zip(damaged_parts, confidences):
+            severity = DAMAGE_TO_SEVERITY_MAPPING.get(part['damage_type'], "moderate")
+            annotations.append({
+                "damage_type": part['damage_type'],
+                "part": part['part_name'],
+                "bbox": part['bbox'],
+                "confidence": confidence,
+                "severity": severity,
+                "severity_code": _SEVERITY_CODES[severity]
+            })
+    affected_parts = [p['part_name'] for p in damaged_parts]
 
     report = {
-        "claim_id": state['claim_id'],
+        "claim_id": rs.claim_id,
         "assessment_result": {
             "quality_check": {
                 "passed": True,
                 "average_quality": quality_res['quality_score']
             },
             "damage_summary": {
-                "total_damages_found": len(damage_res['detections']),
-                "affected_parts": [p['part_name'] for p in part_res['damaged_parts']],
+                "total_damages_found": num_detections,
+                "affected_parts": affected_parts,
                 "overall_severity": severity_res['overall_severity'],
-                "confidence_score": round(sum(d['confidence'] for d in damage_res['detections']) / len(damage_res['detections']), 2) if damage_res['detections'] else 0
+                "confidence_score": confidence_score
             },
-            "annotations": [{"image_id": state['image_path'].split('/')[-1], "detections": annotations}],
+            "annotations": [{"image_id": image_id, "detections": annotations}],
             "repair_estimate": {
                 "cost_range": severity_res['estimated_cost_range'],
                 "repair_days": severity_res['repair_time_days'],
@@ -129,13 +214,14 @@ def compile_final_report(state: GraphState) -> GraphState:
         }
     }
     
-    state['final_report'] = report
-    state['processing_log'].append("Process Complete.")
-    return state
+    return {
+        "processing_log": ["Step 5: Compiling Final Report...", "Process Complete."],
+        "final_report": report
+    }
 
 # --- 3. Define Conditional Edge ---
 def should_continue(state: GraphState) -> str:
-    """Determines the next step based on the image quality check."""
+    """Determines the next step once both the quality check and damage detection are done."""
     if state['quality_check_result']['processable']:
         return "continue_processing"
     else:
@@ -149,25 +235,27 @@ def build_graph():
     # Add nodes
     workflow.add_node("quality_check", run_quality_check)
     workflow.add_node("damage_detection", run_damage_detection)
+    workflow.add_node("join_checks", join_initial_checks)
     workflow.add_node("part_identification", run_part_identification)
     workflow.add_node("severity_assessment", run_severity_assessment)
     workflow.add_node("compile_report", compile_final_report)
 
-    # Set the entry point
-    workflow.set_entry_point("quality_check")
+    # The quality check and damage detection only need the image, so they
+    # start in parallel and join before the rest of the pipeline.
+    workflow.add_conditional_edges(START, dispatch_initial_checks, ["quality_check", "damage_detection"])
+    workflow.add_edge(["quality_check", "damage_detection"], "join_checks")
 
-    # Add conditional edge from quality check
+    # Add conditional edge gating on the quality check
     workflow.add_conditional_edges(
-        "quality_check",
+        "join_checks",
         should_continue,
         {
-            "continue_processing": "damage_detection",
+            "continue_processing": "part_identification",
             "terminate_processing": "compile_report"
         }
     )
 
     # Add sequential edges for the main workflow
-    workflow.add_edge("damage_detection", "part_identification")
     workflow.add_edge("part_identification", "severity_assessment")
     workflow.add_edge("severity_assessment", "compile_report")
 
@@ -178,9 +266,16 @@ def build_graph():
     return workflow.compile()
 
 # --- Helper for importing in other files ---
-# This avoids running the build process every time the file is imported.
-# We create a single, compiled instance of the graph.
-damage_assessment_graph = build_graph()
+# The graph is built on first request and then reused, so the build process
+# doesn't run just because the file is imported.
+@functools.cache
+def get_graph():
+    """Returns the process-wide compiled graph, creating the agents and building it on first call."""
+    _get_agents()
+    return build_graph()
 
-# Dummy import to satisfy the final report compilation logic
-from utils.config import DAMAGE_TO_SEVERITY_MAPPING
\ No newline at end of file
+def __getattr__(name):
+    # Back-compat for callers importing the graph as a module attribute
+    if name == "damage_assessment_graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
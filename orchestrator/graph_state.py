@@ -1,4 +1,6 @@
-from typing import List, Dict, Any, Optional
+import operator
+from dataclasses import dataclass, field
+from typing import Annotated, List, Dict, Any, Optional
 from typing_extensions import TypedDict
 
 class GraphState(TypedDict):
@@ -7,6 +9,10 @@ class GraphState(TypedDict):
 
     This state object accumulates the data as a claim is processed through
     the multi-agent pipeline. It uses proper Python type annotations.
+
+    Nodes return only the fields they update. Plain fields are overwritten
+    by each update, so a field that parallel nodes both write (like
+    ``processing_log``) needs an ``Annotated`` reducer to merge the updates.
     """
     
     # --- Initial Inputs ---
@@ -14,9 +20,19 @@ class GraphState(TypedDict):
     image_path: str
     
     # --- State Tracking ---
-    processing_log: List[str]
+    # Nodes return only their new log lines; the reducer appends them, so
+    # parallel nodes can log in the same step. operator.add builds a new list
+    # rather than extending in place, because LangGraph shares channel values
+    # with the snapshots it hands back.
+    processing_log: Annotated[List[str], operator.add]
     error_message: Optional[str]
 
+    # --- Shared Model Input ---
+    # (tensor, orig_shape) from preprocess_once, reused by both YOLO agents.
+    preprocessed_image: Optional[Any]
+    # Raw part detections produced alongside damage detection by DualYOLO.
+    detected_parts: Optional[List[Dict[str, Any]]]
+
     # --- Agent Outputs ---
     # These fields will be populated by the respective agents.
     quality_check_result: Optional[Dict[str, Any]]
@@ -26,4 +42,31 @@ class GraphState(TypedDict):
 
     # --- Final Compiled Output ---
     # This will hold the final, formatted report.
-    final_report: Optional[Dict[str, Any]]
\ No newline at end of file
+    final_report: Optional[Dict[str, Any]]
+
+
+@dataclass(slots=True)
+class _RuntimeState:
+    """
+    A slotted, attribute-access copy of a GraphState for use inside nodes.
+
+    LangGraph owns the TypedDict schema and passes nodes a plain dict. Nodes
+    that read many fields convert it once with ``from_state`` instead of
+    repeating string-keyed lookups, and return a plain update dict as usual.
+    """
+    claim_id: str
+    image_path: str
+    processing_log: List[str] = field(default_factory=list)
+    error_message: Optional[str] = None
+    preprocessed_image: Optional[Any] = None
+    detected_parts: Optional[List[Dict[str, Any]]] = None
+    quality_check_result: Optional[Dict[str, Any]] = None
+    damage_detection_result: Optional[Dict[str, Any]] = None
+    part_identification_result: Optional[Dict[str, Any]] = None
+    severity_assessment_result: Optional[Dict[str, Any]] = None
+    final_report: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_state(cls, state: GraphState) -> "_RuntimeState":
+        """Copies the fields present in ``state``; missing ones keep their defaults."""
+        return cls(**{name: state[name] for name in cls.__dataclass_fields__ if name in state})
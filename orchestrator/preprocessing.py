@@ -0,0 +1,38 @@
+import cv2
+import numpy as np
+import torch
+from ultralytics.data.augment import LetterBox
+
+# Square input size both YOLO models were trained and exported with.
+INPUT_SIZE = 640
+
+_letterbox = LetterBox(new_shape=(INPUT_SIZE, INPUT_SIZE), auto=False)
+
+
+def preprocess_once(image_path: str):
+    """
+    Decodes and letterboxes an image into a YOLO input tensor.
+
+    The damage and part models share the same input pipeline, so the
+    orchestrator runs this once per claim and hands the tensor to both agents
+    instead of letting each of them re-read and re-normalize the file.
+
+    Args:
+        image_path (str): The path to the image file.
+
+    Returns:
+        tuple | None: ``(tensor, orig_shape)`` where ``tensor`` is a
+        ``(1, 3, 640, 640)`` float tensor in [0, 1] and ``orig_shape`` is the
+        original ``(height, width)``, or None if the image can't be decoded.
+    """
+    # OpenCV's libjpeg-turbo decode is considerably faster than PIL's and
+    # yields a C-contiguous BGR uint8 array, the layout YOLO expects.
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+
+    letterboxed = _letterbox(image=image)
+    # BGR -> RGB, HWC -> CHW
+    chw = np.ascontiguousarray(letterboxed[..., ::-1].transpose(2, 0, 1))
+    tensor = torch.from_numpy(chw).float().div_(255.0).unsqueeze(0)
+    return tensor, image.shape[:2]
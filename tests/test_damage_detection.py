@@ -0,0 +1,13 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("ultralytics")
+from agents.damage_detection_agent import round_confidences
+
+
+def test_confidences_match_python_round():
+    conf = np.array([0.8712, 0.33, 0.125, 0.999, 0.005], dtype=np.float32)
+    rounded = round_confidences(conf)
+    assert rounded == [round(float(c), 2) for c in conf]
+    assert rounded[:2] == [0.87, 0.33]
+    assert all(type(c) is float for c in rounded)
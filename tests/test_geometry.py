@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from orchestrator._bbox import pair_iou
+from utils.geometry import (
+    attach_area, calculate_iou, calculate_iou_all_pairs, calculate_iou_matrix,
+    calculate_iou_matrix_gpu, calculate_iou_matrix_tiled, calculate_iou_self,
+)
+
+BOXES = np.array([
+    [0, 0, 10, 10],
+    [5, 5, 15, 15],
+    [20, 20, 30, 40],
+    [0, 0, 10, 10],
+], dtype=np.float32)
+
+
+def _reference(a, b):
+    return np.array([[calculate_iou(x, y) for y in b] for x in a])
+
+
+@pytest.mark.parametrize("fn", [
+    calculate_iou_matrix, calculate_iou_all_pairs, pair_iou,
+    calculate_iou_matrix_tiled, calculate_iou_matrix_gpu,
+])
+def test_matrix_functions_accept_area_column(fn):
+    expected = _reference(BOXES, BOXES)
+    with_area = attach_area(BOXES)
+    assert with_area.shape == (4, 5)
+
+    for a, b in [(with_area, BOXES), (BOXES, with_area), (with_area, with_area)]:
+        result = fn(a, b)
+        assert result.shape == (4, 4)
+        np.testing.assert_allclose(result, expected, atol=1e-6)
+
+
+def test_self_iou_accepts_area_column():
+    np.testing.assert_allclose(calculate_iou_self(attach_area(BOXES)), _reference(BOXES, BOXES), atol=1e-6)
+
+
+def test_rejects_other_widths():
+    with pytest.raises(ValueError):
+        calculate_iou_matrix(np.zeros((4, 6)), BOXES)
+
+
+def test_self_iou_matches_full_matrix_across_bands():
+    rng = np.random.default_rng(0)
+    xy = rng.random((300, 2)) * 500
+    boxes = np.hstack([xy, xy + rng.random((300, 2)) * 100]).astype(np.float32)
+    boxes[7, 2:] = boxes[7, :2]  # zero-area box: 0.0 on the diagonal, like everywhere else
+
+    result = calculate_iou_self(boxes, tile=64)
+    np.testing.assert_array_equal(result, calculate_iou_matrix(boxes, boxes))
+    assert result[7, 7] == 0.0
+
+
+@pytest.mark.parametrize("box", [[0, 0, 10, 10], [0.1, 0.2, 0.1003, 0.2004], [1000, 2000, 1003.5, 2007.25]])
+def test_identical_boxes_are_exactly_one(box):
+    assert calculate_iou(box, box) == 1.0
+    assert calculate_iou_all_pairs([box], [box])[0, 0] == 1.0
+    assert pair_iou([box], [box])[0, 0] == 1.0
+    assert calculate_iou_matrix([box], [box], dtype=np.float64)[0, 0] == 1.0
+    assert calculate_iou_matrix([box], [box])[0, 0] == 1.0
+    assert calculate_iou_self([box])[0, 0] == 1.0
+
+
+def test_zero_area_boxes_are_zero():
+    point, line = [5, 5, 5, 5], [0, 3, 10, 3]
+    assert calculate_iou(point, point) == 0.0
+    assert calculate_iou(line, line) == 0.0
+    assert calculate_iou(point, [0, 0, 10, 10]) == 0.0
+    for fn in (calculate_iou_matrix, calculate_iou_all_pairs, pair_iou, calculate_iou_matrix_tiled):
+        np.testing.assert_array_equal(fn([point, line], [point, line]), 0.0)
+    np.testing.assert_array_equal(calculate_iou_self([point, line]), 0.0)
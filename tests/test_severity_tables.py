@@ -0,0 +1,9 @@
+from agents.severity_assessment_agent import _LEVEL_TO_SEVERITY, _SEVERITY_LEVELS
+from utils.config import SEVERITY_LEVELS
+
+
+def test_level_to_severity_matches_config():
+    # Index 0 is the unused placeholder; every real level maps back to its name
+    assert _LEVEL_TO_SEVERITY[1:] == tuple(SEVERITY_LEVELS)
+    for name, level in _SEVERITY_LEVELS.items():
+        assert _LEVEL_TO_SEVERITY[level] == name
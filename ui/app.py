@@ -1,85 +1,225 @@
+import asyncio
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
 import gradio as gr
-import time
+import numpy as np
+from PIL import Image
 import uuid
 import json
 
-from orchestrator.damage_assessment_graph import damage_assessment_graph, GraphState
+from orchestrator.damage_assessment_graph import get_graph, GraphState
+from orchestrator.batch import process_batch, _init_state
 # Import all three drawing utilities now
 from ui.utils import draw_annotations, draw_raw_detection_boxes, draw_part_assignments
+from utils.cache import file_digest
 
-def process_damage_claim(image_path, progress=gr.Progress(track_tqdm=True)):
+# --- Pipeline result cache ---
+# Re-submitting an image that was just assessed replays the recorded node
+# outputs instead of re-running the graph. Keyed by the image contents and
+# bounded by CACHED_RESULT_SIZE_MB; the cache lives in memory, so a restart
+# with new code or weights always starts empty.
+PIPELINE_CACHE_ENABLED = os.getenv("PIPELINE_CACHE_ENABLED", "1") == "1"
+CACHED_RESULT_SIZE_MB = float(os.getenv("CACHED_RESULT_SIZE_MB", "64"))
+# Large intermediates the UI never reads; not worth keeping per image
+_UNCACHED_FIELDS = ("preprocessed_image", "detected_parts")
+
+_pipeline_cache = OrderedDict()
+_pipeline_cache_bytes = 0
+
+def _pickled_size(updates: list) -> int:
+    """Measures a run's node updates by their pickled size; slow, so run it off the event loop."""
+    return len(pickle.dumps(updates, protocol=pickle.HIGHEST_PROTOCOL))
+
+def _cache_result(key, updates: list, size: int):
+    """Stores a finished run's node updates, evicting the oldest runs past the size cap."""
+    global _pipeline_cache_bytes
+    max_bytes = CACHED_RESULT_SIZE_MB * 1024 * 1024
+    if size > max_bytes:
+        return
+    if key in _pipeline_cache:
+        _pipeline_cache_bytes -= _pipeline_cache.pop(key)[1]
+    _pipeline_cache[key] = (updates, size)
+    _pipeline_cache_bytes += size
+    while _pipeline_cache_bytes > max_bytes:
+        _, (_, evicted_size) = _pipeline_cache.popitem(last=False)
+        _pipeline_cache_bytes -= evicted_size
+
+# --- UI rendering helpers ---
+# Nodes started together by the graph's fan-out, flushed as one UI update
+_PARALLEL_NODES = ("quality_check", "damage_detection")
+# Annotated images are written here as JPEGs. Gradio copies each one into its
+# own cache when it is sent, so only the most recent claims' files are kept.
+_ANNOTATION_DIR = tempfile.TemporaryDirectory(prefix="damage_assessment_ui_")
+_MAX_ANNOTATED_CLAIMS = int(os.getenv("MAX_ANNOTATED_CLAIMS", "32"))
+_annotation_files = OrderedDict()
+# Claims render in worker threads, so the file bookkeeping is shared
+_annotation_lock = threading.Lock()
+
+def _to_jpeg(image: np.ndarray, claim_id: str, step: str) -> str:
+    """
+    Writes an annotated RGB image to a JPEG file for display.
+
+    Passing a file path lets Gradio ship a compressed JPEG to the browser
+    instead of serializing the raw pixel array.
+
+    Args:
+        image (np.ndarray): The RGB image returned by a draw_* helper.
+        claim_id (str): The claim the image belongs to.
+        step (str): The pipeline step, used to name the file.
+
+    Returns:
+        str: The path to the written JPEG.
+    """
+    path = os.path.join(_ANNOTATION_DIR.name, f"{claim_id}_{step}.jpg")
+    Image.fromarray(image).save(path, format="JPEG", quality=85)
+
+    with _annotation_lock:
+        _annotation_files.setdefault(claim_id, []).append(path)
+        _annotation_files.move_to_end(claim_id)
+        stale_claims = []
+        while len(_annotation_files) > _MAX_ANNOTATED_CLAIMS:
+            stale_claims.append(_annotation_files.popitem(last=False)[1])
+    for stale_paths in stale_claims:
+        for stale in stale_paths:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+def _render(draw, image_path: str, result: dict, claim_id: str, step: str) -> str:
+    """
+    Draws a step's annotations and writes them to a JPEG, in the calling thread.
+
+    Drawing and encoding stay in one call because the draw_* helpers return
+    the calling thread's reusable canvas, which the next draw overwrites.
+    The handler runs this through ``asyncio.to_thread`` so the decode, draw
+    and encode never block the event loop.
+    """
+    return _to_jpeg(draw(image_path, result), claim_id, step)
+
+def _step_updates(keys: tuple, *values) -> dict:
+    """
+    Maps a step's new values onto its components and reveals the step.
+
+    Plain values are passed for the components, so only the accordion (the
+    last key) needs a ``gr.update``; components not listed are left untouched.
+    """
+    updates = dict(zip(keys, values))
+    updates[keys[-1]] = gr.update(visible=True)
+    return updates
+
+async def _stream_pipeline(initial_state: GraphState):
+    """
+    Yields ``{node_name: node_output}`` updates for a claim, from the cache when
+    the same image was already assessed, otherwise from the graph.
+    """
+    key = None
+    if PIPELINE_CACHE_ENABLED:
+        try:
+            # Reads and hashes the whole upload, so keep it off the event loop
+            key = await asyncio.to_thread(file_digest, initial_state['image_path'])
+        except OSError:
+            pass
+
+    cached = _pipeline_cache.get(key) if key else None
+    if cached is not None:
+        _pipeline_cache.move_to_end(key)
+        for node_name, node_output in cached[0]:
+            # The report belongs to this claim, not the one it was cached under
+            if node_name == 'compile_report':
+                node_output = dict(node_output, final_report=dict(node_output['final_report'], claim_id=initial_state['claim_id']))
+            yield {node_name: node_output}
+        return
+
+    recorded = []
+    # A cold first call loads and exports both models; keep that off the event loop
+    graph = await asyncio.to_thread(get_graph)
+    # "updates" yields only each node's delta, never the accumulated state
+    async for state_update in graph.astream(initial_state, stream_mode="updates"):
+        if key:
+            for node_name, node_output in state_update.items():
+                if node_output:
+                    node_output = {k: v for k, v in node_output.items() if k not in _UNCACHED_FIELDS}
+                recorded.append((node_name, node_output))
+        yield state_update
+
+    # Only complete runs reach this point; a halted stream is never cached
+    if key:
+        _cache_result(key, recorded, await asyncio.to_thread(_pickled_size, recorded))
+
+async def process_damage_claim(image_path, progress=gr.Progress(track_tqdm=True)):
     """
     Main processing function that streams step-by-step updates to the UI.
     """
     if image_path is None:
         gr.Warning("Please upload an image first!")
-        return {
-            quality_output_group: gr.update(visible=False),
-            damage_output_group: gr.update(visible=False),
-            parts_output_group: gr.update(visible=False),
-            final_report_group: gr.update(visible=False),
-        }
+        yield {group: gr.update(visible=False) for group in _OUTPUT_GROUPS}
+        return
 
     # --- 1. Reset UI for a new run ---
-    yield {
-        quality_output_group: gr.update(visible=False),
-        damage_output_group: gr.update(visible=False),
-        parts_output_group: gr.update(visible=False),
-        final_report_group: gr.update(visible=False),
-    }
+    yield {group: gr.update(visible=False) for group in _OUTPUT_GROUPS}
 
     claim_id = f"CLM-{str(uuid.uuid4())[:8].upper()}"
-    initial_state = GraphState(
-        claim_id=claim_id, image_path=image_path, processing_log=[],
-        error_message=None, quality_check_result=None, damage_detection_result=None,
-        part_identification_result=None, severity_assessment_result=None, final_report=None
-    )
+    initial_state = _init_state(image_path, claim_id)
 
     # --- 2. Stream the graph and update UI at each step ---
-    final_state = None
-    for state_update in damage_assessment_graph.stream(initial_state):
-        node_name = list(state_update.keys())[0]
+    # Component updates are collected per node and flushed in one yield. The
+    # quality check and damage detection run in parallel, so their updates are
+    # held back and sent together once both have finished.
+    pending_updates = {}
+    async for state_update in _stream_pipeline(initial_state):
+        node_name = next(iter(state_update))
         node_output = state_update[node_name]
-        final_state = node_output
 
         if node_name == 'quality_check':
             qc_result = node_output['quality_check_result']
             status_text = f"Quality Score: {qc_result['quality_score']}\nProcessable: {qc_result['processable']}\nIssues: {qc_result['issues'] or 'None'}"
-            yield {quality_status: gr.update(value=status_text), quality_output_group: gr.update(visible=True)}
+            quality_updates = _step_updates(_QC_KEYS, status_text)
             if not qc_result['processable']:
+                # Don't show damage results for a rejected image
+                pending_updates = quality_updates
                 gr.Error("Image quality too low. Process halted.")
                 break
+            pending_updates.update(quality_updates)
 
         elif node_name == 'damage_detection':
             dd_result = node_output['damage_detection_result']
-            annotated_img = draw_raw_detection_boxes(image_path, dd_result)
-            yield {
-                damage_annotated_image: gr.update(value=annotated_img),
-                damage_raw_json: gr.update(value=dd_result),
-                damage_output_group: gr.update(visible=True)
-            }
+            annotated_path = await asyncio.to_thread(_render, draw_raw_detection_boxes, image_path, dd_result, claim_id, "damage")
+            pending_updates.update(_step_updates(_DD_KEYS, annotated_path, dd_result))
 
         elif node_name == 'part_identification':
             pi_result = node_output['part_identification_result']
             # --- NEW: Call the new drawing function for this step ---
-            part_assignment_img = draw_part_assignments(image_path, pi_result)
-            yield {
-                # --- NEW: Update the new image component ---
-                parts_annotated_image: gr.update(value=part_assignment_img),
-                parts_identified_json: gr.update(value=pi_result),
-                parts_output_group: gr.update(visible=True)
-            }
+            part_assignment_path = await asyncio.to_thread(_render, draw_part_assignments, image_path, pi_result, claim_id, "parts")
+            pending_updates.update(_step_updates(_PI_KEYS, part_assignment_path, pi_result))
         
         elif node_name == 'compile_report':
             final_report = node_output.get('final_report', {})
-            final_annotated_img = draw_annotations(image_path, final_report)
-            yield {
-                final_annotated_image: gr.update(value=final_annotated_img),
-                final_report_json: gr.update(value=final_report),
-                final_report_group: gr.update(visible=True)
-            }
-        
-        time.sleep(0.5)
+            final_annotated_path = await asyncio.to_thread(_render, draw_annotations, image_path, final_report, claim_id, "final")
+            pending_updates.update(_step_updates(_REPORT_KEYS, final_annotated_path, final_report))
+
+        # Nodes that change nothing on screen don't trigger a re-render
+        if pending_updates and node_name not in _PARALLEL_NODES:
+            yield pending_updates
+            pending_updates = {}
+
+    if pending_updates:
+        yield pending_updates
+
+async def process_batch_claims(image_paths):
+    """
+    Assesses every uploaded image as its own claim, all at once, and returns their reports.
+    """
+    if not image_paths:
+        gr.Warning("Please upload at least one image first!")
+        return []
+
+    final_states = await process_batch(list(image_paths))
+    return [state['final_report'] for state in final_states]
 
 # --- Build the New Gradio Interface ---
 with gr.Blocks(theme=gr.themes.Soft(), title="Vehicle Damage Assessment") as demo:
@@ -122,11 +262,34 @@ with gr.Blocks(theme=gr.themes.Soft(), title="Vehicle Damage Assessment") as dem
         final_annotated_image, final_report_json, final_report_group
     ]
 
+    # --- Per-step output keys, fixed once the layout is built ---
+    # Each step's value components, followed by the accordion that reveals them
+    _QC_KEYS = (quality_status, quality_output_group)
+    _DD_KEYS = (damage_annotated_image, damage_raw_json, damage_output_group)
+    _PI_KEYS = (parts_annotated_image, parts_identified_json, parts_output_group)
+    _REPORT_KEYS = (final_annotated_image, final_report_json, final_report_group)
+    _OUTPUT_GROUPS = (quality_output_group, damage_output_group, parts_output_group, final_report_group)
+
     submit_button.click(
         fn=process_damage_claim,
         inputs=[input_image],
         outputs=all_outputs
     )
 
+    with gr.Accordion("Batch Assessment", open=False):
+        gr.Markdown("Upload several images to assess them concurrently, one claim per image.")
+        with gr.Row():
+            with gr.Column(scale=1):
+                batch_files = gr.File(file_count="multiple", file_types=["image"], type="filepath", label="Upload Vehicle Images")
+                batch_button = gr.Button("Assess All", variant="primary")
+            with gr.Column(scale=2):
+                batch_reports_json = gr.JSON(label="Reports")
+
+    batch_button.click(
+        fn=process_batch_claims,
+        inputs=[batch_files],
+        outputs=[batch_reports_json]
+    )
+
 if __name__ == "__main__":
     demo.launch()
\ No newline at end of file
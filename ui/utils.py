@@ -1,87 +1,124 @@
+import os
+import threading
+from functools import lru_cache
 import cv2
 import numpy as np
-from PIL import Image
+from utils.config import SEVERITY_LEVELS
 
 # Define a color map for different severity levels to be used in annotations.
-# Colors are in BGR format for OpenCV.
+# Colors are RGB: images are drawn on in RGB, the format Gradio displays.
 SEVERITY_COLOR_MAP = {
     "minor": (0, 255, 0),      # Green
-    "moderate": (0, 255, 255), # Yellow
-    "major": (0, 165, 255),    # Orange
-    "severe": (0, 0, 255),     # Red
-    "default": (255, 0, 0)     # Blue (for any unknown cases)
+    "moderate": (255, 255, 0), # Yellow
+    "major": (255, 165, 0),    # Orange
+    "severe": (255, 0, 0),     # Red
+    "default": (0, 0, 255)     # Blue (for any unknown cases)
 }
 
+# Colors indexed by an annotation's severity_code; the trailing row is the default
+_SEV_LUT = np.array(
+    [SEVERITY_COLOR_MAP[s] for s in SEVERITY_LEVELS] + [SEVERITY_COLOR_MAP["default"]], dtype=np.uint8
+)
+_DEFAULT_SEV_CODE = len(SEVERITY_LEVELS)
+_SEV_CODE = {s: i for i, s in enumerate(SEVERITY_LEVELS)}
+
+# Each upload gets a unique temp path, so an entry only needs to outlive the
+# three draws of one claim; a few slots cover claims running side by side
+# without pinning dozens of full-resolution frames (~36 MB each at 12 MP).
+@lru_cache(maxsize=4)
+def _decode_rgb(image_path: str, mtime: float) -> np.ndarray:
+    # Decode with OpenCV like the models do, so EXIF orientation (and with it
+    # the bbox coordinates) matches; the one conversion is cached with the image.
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise FileNotFoundError(image_path)
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    # Shared between callers, so make accidental in-place drawing fail loudly
+    image.setflags(write=False)
+    return image
+
+def _load_image_rgb(image_path: str) -> np.ndarray:
+    """
+    Returns the decoded RGB image, read-only and shared across the draw_* calls.
+
+    A claim draws the same image up to three times, so the decode is cached.
+    The file's mtime is part of the key, so a re-upload to the same path is
+    decoded again. Callers must copy it (see ``_canvas_for``) before drawing.
+    """
+    return _decode_rgb(image_path, os.path.getmtime(image_path))
+
+# Per-thread drawing buffer, reused across calls instead of copying into a fresh array
+_tls = threading.local()
+
+def _canvas_for(image: np.ndarray) -> np.ndarray:
+    """
+    Copies ``image`` into this thread's reusable drawing buffer.
+
+    The buffer grows to the largest image seen and is never shrunk, so repeated
+    draws don't allocate. The returned view is C-contiguous (OpenCV draws on
+    it in place) and is only valid until the next draw call on the same thread.
+    """
+    buf = getattr(_tls, "buf", None)
+    if buf is None or buf.size < image.size:
+        buf = _tls.buf = np.empty(image.size, dtype=np.uint8)
+    canvas = buf[:image.size].reshape(image.shape)
+    np.copyto(canvas, image)
+    return canvas
+
+# All labels share one row height; "Ag" spans both ascenders and descenders
+(_, _TEXT_HEIGHT), _ = cv2.getTextSize("Ag", cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+
+@lru_cache(maxsize=256)
+def _text_width(label: str) -> int:
+    # Labels repeat across claims (same damage/part names), so measure each once
+    return cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)[0][0]
+
+def _int_boxes(items: list):
+    """
+    Drops items without a valid [x1, y1, x2, y2] bbox and converts the rest in one step.
+
+    Returns:
+        tuple: ``(items, boxes)`` where ``boxes`` holds the matching integer
+        coordinates as lists, truncated like ``int()``.
+    """
+    items = [item for item in items if item.get("bbox") and len(item["bbox"]) == 4]
+    if not items:
+        return items, []
+    return items, np.asarray([item["bbox"] for item in items], dtype=np.int32).tolist()
+
+# Placeholder returned when the image can't be loaded; read-only, since it's shared
+_BLANK_IMG = np.zeros((400, 600, 3), dtype=np.uint8)
+_BLANK_IMG.setflags(write=False)
+
+# All draw_* helpers return an RGB uint8 image, on success and on error alike.
+# The result is this thread's canvas (or the shared blank placeholder): use
+# (e.g. encode) it before the next draw call on the same thread, or copy it.
 def draw_raw_detection_boxes(image_path: str, damage_detection_result: dict) -> np.ndarray:
     """
     Draws simple bounding boxes from the initial damage detection step.
     Uses a single color since severity and parts are not yet known.
     """
     try:
-        image = Image.open(image_path).convert("RGB")
-        image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        image_cv = _canvas_for(_load_image_rgb(image_path))
     except FileNotFoundError:
-        return np.zeros((400, 600, 3), dtype=np.uint8)
+        return _BLANK_IMG
 
     detections = damage_detection_result.get("detections", [])
     
-    raw_detection_color = (255, 0, 0) 
+    raw_detection_color = (0, 0, 255) # Blue
 
-    for detection in detections:
-        bbox = detection.get("bbox")
-        if not bbox or len(bbox) != 4:
-            continue
-
-        x1, y1, x2, y2 = map(int, bbox)
+    detections, boxes = _int_boxes(detections)
+    for detection, (x1, y1, x2, y2) in zip(detections, boxes):
         damage_type = detection.get("damage_type", "N/A")
         confidence = detection.get("confidence", 0)
         
         cv2.rectangle(image_cv, (x1, y1), (x2, y2), raw_detection_color, 2)
         
         label = f"{damage_type.capitalize()} ({confidence:.0%})"
-        (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-        cv2.rectangle(image_cv, (x1, y1 - 20), (x1 + text_width, y1), raw_detection_color, -1)
+        cv2.rectangle(image_cv, (x1, y1 - 20), (x1 + _text_width(label), y1), raw_detection_color, -1)
         cv2.putText(image_cv, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
 
-    return cv2.cvtColor(image_cv, cv2.COLOR_BGR2RGB)
-
-import cv2
-import numpy as np
-from PIL import Image
-
-# Define a color map for different severity levels to be used in annotations.
-# Colors are in BGR format for OpenCV.
-SEVERITY_COLOR_MAP = {
-    "minor": (0, 255, 0),      # Green
-    "moderate": (0, 255, 255), # Yellow
-    "major": (0, 165, 255),    # Orange
-    "severe": (0, 0, 255),     # Red
-    "default": (255, 0, 0)     # Blue (for any unknown cases)
-}
-
-# --- EXISTING FUNCTION (NO CHANGES) ---
-def draw_raw_detection_boxes(image_path: str, damage_detection_result: dict) -> np.ndarray:
-    # ... (this function remains the same)
-    try:
-        image = Image.open(image_path).convert("RGB")
-        image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-    except FileNotFoundError:
-        return np.zeros((400, 600, 3), dtype=np.uint8)
-    detections = damage_detection_result.get("detections", [])
-    raw_detection_color = (255, 0, 0) 
-    for detection in detections:
-        bbox = detection.get("bbox")
-        if not bbox or len(bbox) != 4: continue
-        x1, y1, x2, y2 = map(int, bbox)
-        damage_type = detection.get("damage_type", "N/A")
-        confidence = detection.get("confidence", 0)
-        cv2.rectangle(image_cv, (x1, y1), (x2, y2), raw_detection_color, 2)
-        label = f"{damage_type.capitalize()} ({confidence:.0%})"
-        (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-        cv2.rectangle(image_cv, (x1, y1 - 20), (x1 + text_width, y1), raw_detection_color, -1)
-        cv2.putText(image_cv, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-    return cv2.cvtColor(image_cv, cv2.COLOR_BGR2RGB)
-
+    return image_cv
 
 # --- NEW FUNCTION ---
 def draw_part_assignments(image_path: str, part_identification_result: dict) -> np.ndarray:
@@ -89,22 +126,17 @@ def draw_part_assignments(image_path: str, part_identification_result: dict) ->
     Draws bounding boxes of damages and labels them with the identified car part.
     """
     try:
-        image = Image.open(image_path).convert("RGB")
-        image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        image_cv = _canvas_for(_load_image_rgb(image_path))
     except FileNotFoundError:
-        return np.zeros((400, 600, 3), dtype=np.uint8)
+        return _BLANK_IMG
 
     damaged_parts = part_identification_result.get("damaged_parts", [])
     
     # Use a distinct color for this step (e.g., orange)
-    assignment_color = (0, 165, 255)
+    assignment_color = (255, 165, 0)
 
-    for part in damaged_parts:
-        bbox = part.get("bbox")
-        if not bbox or len(bbox) != 4:
-            continue
-
-        x1, y1, x2, y2 = map(int, bbox)
+    damaged_parts, boxes = _int_boxes(damaged_parts)
+    for part, (x1, y1, x2, y2) in zip(damaged_parts, boxes):
         part_name = part.get("part_name", "N/A")
         damage_type = part.get("damage_type", "N/A")
         
@@ -113,11 +145,10 @@ def draw_part_assignments(image_path: str, part_identification_result: dict) ->
         
         # Create and draw the label showing the assigned part
         label = f"{damage_type.capitalize()} -> {part_name}"
-        (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-        cv2.rectangle(image_cv, (x1, y1 - 20), (x1 + text_width, y1), assignment_color, -1)
+        cv2.rectangle(image_cv, (x1, y1 - 20), (x1 + _text_width(label), y1), assignment_color, -1)
         cv2.putText(image_cv, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
 
-    return cv2.cvtColor(image_cv, cv2.COLOR_BGR2RGB)
+    return image_cv
 
 
 def draw_annotations(image_path: str, final_report: dict) -> np.ndarray:
@@ -125,47 +156,46 @@ def draw_annotations(image_path: str, final_report: dict) -> np.ndarray:
     Draws final, color-coded bounding boxes and labels on an image.
     """
     try:
-        image = Image.open(image_path).convert("RGB")
-        image_np = np.array(image)
-        # --- THE FIX IS ON THIS LINE ---
-        # Changed cv2.COLOR_RGB_BGR to cv2.COLOR_RGB2BGR
-        image_cv = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+        image_cv = _canvas_for(_load_image_rgb(image_path))
     except FileNotFoundError:
-        return np.zeros((400, 600, 3), dtype=np.uint8)
+        return _BLANK_IMG
 
     if not final_report or "assessment_result" not in final_report:
-        return cv2.cvtColor(image_cv, cv2.COLOR_BGR2RGB) # Return original image in correct format
+        return image_cv # Return the original image
 
     annotations = final_report["assessment_result"].get("annotations", [])
     if not annotations:
-        return cv2.cvtColor(image_cv, cv2.COLOR_BGR2RGB) # Return original image in correct format
+        return image_cv # Return the original image
 
     detections = annotations[0].get("detections", [])
 
-    for detection in detections:
-        bbox = detection.get("bbox")
-        if not bbox or len(bbox) != 4:
-            continue
-
-        x1, y1, x2, y2 = map(int, bbox)
+    detections, boxes = _int_boxes(detections)
+    # Look every box's color up at once; annotations without a severity_code
+    # (older reports) fall back to their severity name
+    codes = np.fromiter(
+        (d["severity_code"] if "severity_code" in d else _SEV_CODE.get(d.get("severity"), _DEFAULT_SEV_CODE)
+         for d in detections),
+        dtype=np.intp,
+        count=len(detections),
+    )
+    colors = _SEV_LUT[np.clip(codes, 0, _DEFAULT_SEV_CODE)].tolist()
+
+    for detection, (x1, y1, x2, y2), color in zip(detections, boxes, colors):
         damage_type = detection.get("damage_type", "N/A")
         part = detection.get("part", "N/A")
         confidence = detection.get("confidence", 0)
-        severity = detection.get("severity", "default")
-        color = SEVERITY_COLOR_MAP.get(severity, SEVERITY_COLOR_MAP["default"])
 
         cv2.rectangle(image_cv, (x1, y1), (x2, y2), color, 2)
         label = f"{damage_type.capitalize()} on {part} ({confidence:.0%})"
-        (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
         label_bg_y2 = y1 - 10
-        label_bg_y1 = label_bg_y2 - text_height - 5
+        label_bg_y1 = label_bg_y2 - _TEXT_HEIGHT - 5
         
         if label_bg_y1 < 0:
             label_bg_y1 = y2 + 5
-            label_bg_y2 = y2 + 10 + text_height
+            label_bg_y2 = y2 + 10 + _TEXT_HEIGHT
 
-        cv2.rectangle(image_cv, (x1, label_bg_y1), (x1 + text_width, label_bg_y2), color, -1)
+        cv2.rectangle(image_cv, (x1, label_bg_y1), (x1 + _text_width(label), label_bg_y2), color, -1)
         cv2.putText(image_cv, label, (x1, y1 - 15 if label_bg_y1 < y1 else y2 + 20), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
 
-    return cv2.cvtColor(image_cv, cv2.COLOR_BGR2RGB)
\ No newline at end of file
+    return image_cv
\ No newline at end of file
@@ -0,0 +1,27 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+# utils/_iou_c.pyx
+# Optional compiled scalar IoU. Build in place with:
+#     cythonize -i utils/_iou_c.pyx
+# utils.geometry falls back to its Numba/Python kernel when this isn't built.
+
+
+cpdef double iou_c(double ax1, double ay1, double ax2, double ay2,
+                   double bx1, double by1, double bx2, double by2) nogil:
+    """
+    Calculates the IoU of box A and box B, both given as x1, y1, x2, y2.
+
+    Declared nogil, so C/Cython callers can run it from many threads at once.
+    """
+    cdef double xA = ax1 if ax1 > bx1 else bx1
+    cdef double yA = ay1 if ay1 > by1 else by1
+    cdef double xB = ax2 if ax2 < bx2 else bx2
+    cdef double yB = ay2 if ay2 < by2 else by2
+
+    # Multiplying by the comparison clamps at 0 without a branch
+    cdef double dx = xB - xA
+    cdef double dy = yB - yA
+    dx = dx * (dx > 0)
+    dy = dy * (dy > 0)
+    cdef double inter = dx * dy
+    cdef double union_ = (ax2 - ax1) * (ay2 - ay1) + (bx2 - bx1) * (by2 - by1) - inter
+    return inter / union_ if union_ > 0 else 0.0
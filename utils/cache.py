@@ -0,0 +1,59 @@
+# utils/cache.py
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import xxhash
+except ImportError:  # Optional; blake2b is slower but always available
+    xxhash = None
+
+
+def file_digest(path: str) -> int:
+    """
+    Hashes a file's contents into a 64-bit integer cache key.
+
+    Uses xxh3 when ``xxhash`` is installed, otherwise an 8-byte blake2b.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        int: The content digest.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if xxhash is not None:
+        return xxhash.xxh3_64_intdigest(data)
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class LRUCache:
+    """
+    A small thread-safe least-recently-used mapping, bounded by entry count.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        """
+        Args:
+            maxsize (int): The maximum number of entries kept.
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the cached value for ``key`` and marks it as recently used."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        """Stores ``value`` under ``key``, evicting the oldest entry if full."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
@@ -1,43 +1,85 @@
+import sys
+from types import MappingProxyType
+
+# All tables below are read-only (MappingProxyType / tuples) and their
+# string keys and values are interned, so lookups can short-circuit on
+# identity and no caller can mutate shared config by accident.
+
+def _intern_all(names):
+    return tuple(sys.intern(n) for n in names)
+
 # Car parts taxonomy based on the problem description
-CAR_PARTS = {
-    "exterior": [
-        "front_bumper", "rear_bumper", "hood", "trunk",
-        "left_door", "right_door", "left_fender", "right_fender",
-        "windshield", "rear_window", "side_windows",
-        "left_headlight", "right_headlight", "tail_lights"
-    ],
-    "wheels": ["front_left_wheel", "front_right_wheel", "rear_left_wheel", "rear_right_wheel"]
-}
+CAR_PARTS = MappingProxyType({
+    sys.intern(category): _intern_all(parts)
+    for category, parts in {
+        "exterior": [
+            "front_bumper", "rear_bumper", "hood", "trunk",
+            "left_door", "right_door", "left_fender", "right_fender",
+            "windshield", "rear_window", "side_windows",
+            "left_headlight", "right_headlight", "tail_lights"
+        ],
+        "wheels": ["front_left_wheel", "front_right_wheel", "rear_left_wheel", "rear_right_wheel"]
+    }.items()
+})
 
 # Damage categories based on the problem description
-DAMAGE_TYPES = ["scratch", "dent", "crack", "shatter", "missing", "bent", "paint_damage"]
+DAMAGE_TYPES = _intern_all(["scratch", "dent", "crack", "shatter", "missing", "bent", "paint_damage"])
+
+# Severity levels in ascending order. A level's index is its integer
+# severity code, as reported in each annotation's "severity_code".
+SEVERITY_LEVELS = _intern_all(["minor", "moderate", "major", "severe"])
 
 # Severity mapping rules based on the problem description
-SEVERITY_RULES = {
-    "minor": {"cost_range": [100, 500], "repair_days": 1},
-    "moderate": {"cost_range": [500, 3000], "repair_days": 3},
-    "major": {"cost_range": [3000, 10000], "repair_days": 7},
-    "severe": {"cost_range": [10000, 30000], "repair_days": 14}
-}
+SEVERITY_RULES = MappingProxyType({
+    sys.intern(severity): MappingProxyType({"cost_range": tuple(rules["cost_range"]), "repair_days": rules["repair_days"]})
+    for severity, rules in {
+        "minor": {"cost_range": [100, 500], "repair_days": 1},
+        "moderate": {"cost_range": [500, 3000], "repair_days": 3},
+        "major": {"cost_range": [3000, 10000], "repair_days": 7},
+        "severe": {"cost_range": [10000, 30000], "repair_days": 14}
+    }.items()
+})
 
 # Evaluation metrics for documentation purposes
-EVALUATION_METRICS = {
+EVALUATION_METRICS = MappingProxyType({
     "detection_accuracy": "Percentage of damages correctly identified",
     "localization_iou": "Intersection over Union for bounding boxes",
     "part_classification": "Accuracy of part identification",
     "severity_accuracy": "Correct severity classification rate",
     "processing_speed": "Average time per image",
     "multi_image_consistency": "Consistency across multiple angles"
-}
+})
 
 # A simple mapping to associate damage types with potential severity levels
 # This will be used by the mock severity agent.
-DAMAGE_TO_SEVERITY_MAPPING = {
-    "scratch": "minor",
-    "paint_damage": "minor",
-    "dent": "moderate",
-    "bent": "moderate",
-    "crack": "major",
-    "shatter": "major",
-    "missing": "severe"
-}
\ No newline at end of file
+DAMAGE_TO_SEVERITY_MAPPING = MappingProxyType({
+    sys.intern(damage): sys.intern(severity)
+    for damage, severity in {
+        "scratch": "minor",
+        "paint_damage": "minor",
+        "dent": "moderate",
+        "bent": "moderate",
+        "crack": "major",
+        "shatter": "major",
+        "missing": "severe"
+    }.items()
+})
+# Each damage type's severity, cost range and repair time in one table:
+# DAMAGE_PROPERTIES[damage] == (severity, cost_low, cost_high, repair_days).
+# Prefer this over SEVERITY_RULES[DAMAGE_TO_SEVERITY_MAPPING[damage]], which
+# takes two lookups.
+DAMAGE_PROPERTIES = MappingProxyType({
+    damage: (severity, *SEVERITY_RULES[severity]["cost_range"], SEVERITY_RULES[severity]["repair_days"])
+    for damage, severity in DAMAGE_TO_SEVERITY_MAPPING.items()
+})
+
+# Reverse index of CAR_PARTS: a part's category in one lookup, instead of
+# scanning every category's list for the part.
+PART_TO_CATEGORY = MappingProxyType({
+    part: category
+    for category, parts in CAR_PARTS.items() for part in parts
+})
+
+# Membership sets for validating agent outputs
+ALL_PARTS = frozenset(PART_TO_CATEGORY)
+VALID_DAMAGE_TYPES = frozenset(DAMAGE_TYPES)
@@ -1,9 +1,74 @@
 # utils/geometry.py
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional; the kernels then run as plain Python
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+try:
+    # Compiled from utils/_iou_c.pyx with ``cythonize -i``; optional
+    from utils._iou_c import iou_c
+except ImportError:
+    iou_c = None
+
+
+# The explicit signatures compile the kernels eagerly at import, so no call
+# pays JIT latency; cache=True keeps the machine code on disk (under
+# NUMBA_CACHE_DIR if set), so later processes just load it. The scalar kernel
+# takes plain floats: building arrays for it would cost more than the IoU.
+@njit("float64(float64, float64, float64, float64, float64, float64, float64, float64)",
+      cache=True, fastmath=True)
+def _iou_kernel(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+    # Determine the (x, y)-coordinates of the intersection rectangle
+    xA = max(ax1, bx1)
+    yA = max(ay1, by1)
+    xB = min(ax2, bx2)
+    yB = min(ay2, by2)
+
+    # Compute the area of the intersection rectangle. Clamping each side at 0
+    # compiles to a select rather than a jump, so disjoint pairs cost no
+    # mispredicts and the all-pairs loop can pipeline.
+    interArea = max(xB - xA, 0.0) * max(yB - yA, 0.0)
+
+    # Compute the area of both the prediction and ground-truth rectangles
+    boxAArea = (ax2 - ax1) * (ay2 - ay1)
+    boxBArea = (bx2 - bx1) * (by2 - by1)
+
+    # Compute the union area by taking the sum of the two areas
+    # and subtracting the intersection area.
+    unionArea = float(boxAArea + boxBArea - interArea)
+
+    # Compute the intersection over union; the conditional compiles to a
+    # select, and keeps the result exact (identical boxes give 1.0)
+    return interArea / unionArea if unionArea > 0 else 0.0
+
+
+@njit("void(float64[:, ::1], float64[:, ::1], float64[:, ::1])", parallel=True, cache=True, fastmath=True)
+def _iou_all_pairs_kernel(A, B, out):
+    # Rows are independent, so they are split across threads
+    for i in prange(A.shape[0]):
+        for j in range(B.shape[0]):
+            out[i, j] = _iou_kernel(A[i, 0], A[i, 1], A[i, 2], A[i, 3], B[j, 0], B[j, 1], B[j, 2], B[j, 3])
+
 
 def calculate_iou(boxA, boxB):
     """
     Calculates the Intersection over Union (IoU) of two bounding boxes.
 
+    The arithmetic runs in the compiled ``utils._iou_c`` extension if it has
+    been built, else in a Numba-compiled kernel when numba is installed.
+    Use ``calculate_iou_matrix`` when comparing many boxes at once.
+
     Args:
         boxA (list): The first bounding box in [x1, y1, x2, y2] format.
         boxB (list): The second bounding box in [x1, y1, x2, y2] format.
@@ -11,25 +76,276 @@ def calculate_iou(boxA, boxB):
     Returns:
         float: The IoU value, which is between 0.0 and 1.0.
     """
-    # Determine the (x, y)-coordinates of the intersection rectangle
+    # Indexing beats unpacking: the kernels take eight plain floats
+    if iou_c is not None:
+        return iou_c(boxA[0], boxA[1], boxA[2], boxA[3], boxB[0], boxB[1], boxB[2], boxB[3])
+    return _iou_kernel(boxA[0], boxA[1], boxA[2], boxA[3], boxB[0], boxB[1], boxB[2], boxB[3])
+
+
+def attach_area(boxes, dtype=np.float32) -> np.ndarray:
+    """
+    Appends each box's area as a fifth column.
+
+    The matrix IoU functions read the area from that column instead of
+    recomputing it, so a set of boxes matched repeatedly (e.g. across NMS or
+    matching passes) pays for its areas once.
+
+    Args:
+        boxes (np.ndarray): Boxes of shape (N, 4) in [x1, y1, x2, y2] format.
+        dtype (np.dtype): The dtype of the returned array.
+
+    Returns:
+        np.ndarray: The (N, 5) array of [x1, y1, x2, y2, area] rows.
+    """
+    boxes = np.asarray(boxes, dtype=dtype).reshape(-1, 4)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return np.concatenate([boxes, area[:, None]], axis=1)
+
+
+def _as_boxes(boxes, dtype) -> np.ndarray:
+    # Every box-set entry point goes through here, so an (N, 5) array from
+    # ``attach_area`` keeps its area column instead of being reshaped apart
+    boxes = np.ascontiguousarray(boxes, dtype=dtype)
+    if boxes.ndim == 2 and boxes.shape[1] in (4, 5):
+        return boxes
+    if boxes.size == 0 or boxes.shape == (4,):
+        return boxes.reshape(-1, 4)
+    raise ValueError(f"Expected boxes of shape (N, 4) or (N, 5), got {boxes.shape}")
+
+
+def _box_areas(boxes: np.ndarray) -> np.ndarray:
+    if boxes.shape[1] == 5:
+        return boxes[:, 4]
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+
+def calculate_iou_matrix(boxesA, boxesB, dtype=np.float32, out=None):
+    """
+    Calculates the IoU of every box in ``boxesA`` against every box in ``boxesB``.
+
+    A single broadcast pass replaces N*M calls to ``calculate_iou``. The pass
+    is memory-bound, so it runs in float32 by default: half the bytes of
+    float64, and still far more precise than the pixel coordinates. All
+    arithmetic is done in place in two (N, M) scratch buffers plus ``out``.
+
+    Args:
+        boxesA (np.ndarray): The first set of boxes, shape (N, 4), in [x1, y1, x2, y2]
+            format, or (N, 5) with precomputed areas from ``attach_area``.
+        boxesB (np.ndarray): The second set of boxes, shape (M, 4) or (M, 5).
+        dtype (np.dtype): The precision to compute and return in.
+        out (np.ndarray, optional): An (N, M) array of ``dtype`` to write into,
+            so callers can reuse one buffer across frames.
+
+    Returns:
+        np.ndarray: The (N, M) IoU matrix (``out`` if it was given), with 0.0
+        wherever the union is empty.
+    """
+    boxesA = _as_boxes(boxesA, dtype)
+    boxesB = _as_boxes(boxesB, dtype)
+    if out is None:
+        out = np.empty((boxesA.shape[0], boxesB.shape[0]), dtype=dtype)
+
+    # Intersection width, clipped at 0; ``out`` doubles as scratch until the end
+    inter = np.minimum(boxesA[:, None, 2], boxesB[:, 2])
+    tmp = np.maximum(boxesA[:, None, 0], boxesB[:, 0])
+    np.subtract(inter, tmp, out=inter)
+    np.clip(inter, 0, None, out=inter)
+
+    # Intersection height, then the intersection area
+    np.minimum(boxesA[:, None, 3], boxesB[:, 3], out=tmp)
+    np.maximum(boxesA[:, None, 1], boxesB[:, 1], out=out)
+    np.subtract(tmp, out, out=tmp)
+    np.clip(tmp, 0, None, out=tmp)
+    np.multiply(inter, tmp, out=inter)
+
+    # Union, reusing the height buffer
+    np.add(_box_areas(boxesA)[:, None], _box_areas(boxesB), out=tmp)
+    np.subtract(tmp, inter, out=tmp)
+
+    # Adding the smallest normal float maps an empty union to 0.0 without an
+    # (N, M) bool mask, and leaves every non-subnormal union unchanged, so
+    # results stay exact (identical boxes give 1.0, at any coordinate scale)
+    np.add(tmp, np.finfo(dtype).tiny, out=tmp)
+    return np.divide(inter, tmp, out=out)
+
+
+def calculate_iou_self(boxes, tile: int = 128) -> np.ndarray:
+    """
+    Calculates the (N, N) IoU of a box set against itself, e.g. for NMS.
+
+    IoU is symmetric, so the matrix is built in row bands of ``tile`` boxes:
+    each band is computed only from its diagonal block rightwards and then
+    mirrored below the diagonal, which roughly halves the work of
+    ``calculate_iou_matrix(boxes, boxes)``. The diagonal is computed like
+    any other entry, so zero-area boxes get 0.0 there too.
+
+    Args:
+        boxes (np.ndarray): The boxes, shape (N, 4) or (N, 5).
+        tile (int): The band height.
+
+    Returns:
+        np.ndarray: The symmetric (N, N) float32 IoU matrix.
+    """
+    boxes = _as_boxes(boxes, np.float32)
+    n = len(boxes)
+    out = np.empty((n, n), dtype=np.float32)
+    for i in range(0, n, tile):
+        calculate_iou_matrix(boxes[i:i + tile], boxes[i:], out=out[i:i + tile, i:])
+        out[i + tile:, i:i + tile] = out[i:i + tile, i + tile:].T
+    return out
+
+
+@lru_cache(maxsize=None)
+def _tile_executor() -> ThreadPoolExecutor:
+    # NumPy releases the GIL inside ufuncs, so tiles run truly in parallel
+    return ThreadPoolExecutor(thread_name_prefix="iou-tile")
+
+
+def calculate_iou_matrix_tiled(boxesA, boxesB, tile: int = 256):
+    """
+    Calculates the (N, M) IoU matrix in (tile, tile) blocks.
+
+    At the default tile of 256 each block's float32 scratch buffers are
+    256 KB, so they stay in L2 across all the passes of
+    ``calculate_iou_matrix`` instead of streaming (N, M) arrays through
+    DRAM. Blocks are written straight into the result by a shared thread
+    pool.
+
+    Args:
+        boxesA (np.ndarray): The first set of boxes, shape (N, 4) or (N, 5).
+        boxesB (np.ndarray): The second set of boxes, shape (M, 4) or (M, 5).
+        tile (int): The block edge length.
+
+    Returns:
+        np.ndarray: The (N, M) float32 IoU matrix.
+    """
+    boxesA = _as_boxes(boxesA, np.float32)
+    boxesB = _as_boxes(boxesB, np.float32)
+    n, m = len(boxesA), len(boxesB)
+    out = np.empty((n, m), dtype=np.float32)
+    blocks = [(i, j) for i in range(0, n, tile) for j in range(0, m, tile)]
+
+    def run(block):
+        i, j = block
+        calculate_iou_matrix(boxesA[i:i + tile], boxesB[j:j + tile], out=out[i:i + tile, j:j + tile])
+
+    if len(blocks) > 1:
+        # list() re-raises any exception from a worker
+        list(_tile_executor().map(run, blocks))
+    elif blocks:
+        run(blocks[0])
+    return out
+
+
+# Below this many pairs the host-to-device copies cost more than the GPU saves
+GPU_IOU_MIN_PAIRS = 50_000
+
+
+@lru_cache(maxsize=None)
+def _cuda_available() -> bool:
+    # torch is imported lazily so the geometry helpers stay cheap to import
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+
+def calculate_iou_matrix_gpu(boxesA, boxesB):
+    """
+    Calculates the (N, M) IoU matrix on the GPU with torch.
+
+    Mirrors ``calculate_iou_matrix`` one to one on CUDA tensors. Workloads
+    of at most ``GPU_IOU_MIN_PAIRS`` pairs, or machines without CUDA, use
+    ``calculate_iou_matrix`` on the CPU instead.
+
+    Args:
+        boxesA (np.ndarray): The first set of boxes, shape (N, 4) or (N, 5).
+        boxesB (np.ndarray): The second set of boxes, shape (M, 4) or (M, 5).
+
+    Returns:
+        np.ndarray: The (N, M) float32 IoU matrix, on the host.
+    """
+    boxesA = _as_boxes(boxesA, np.float32)
+    boxesB = _as_boxes(boxesB, np.float32)
+    if len(boxesA) * len(boxesB) <= GPU_IOU_MIN_PAIRS or not _cuda_available():
+        return calculate_iou_matrix(boxesA, boxesB)
+
+    import torch
+    A = torch.as_tensor(boxesA, device="cuda")
+    B = torch.as_tensor(boxesB, device="cuda")
+
+    tl = torch.maximum(A[:, None, :2], B[:, :2])
+    br = torch.minimum(A[:, None, 2:4], B[:, 2:4])
+    wh = (br - tl).clamp_min_(0)
+    inter = wh[..., 0] * wh[..., 1]
+
+    union = _box_areas(A)[:, None] + _box_areas(B) - inter
+    return (inter / (union + np.finfo(np.float32).tiny)).cpu().numpy()
+
+
+def calculate_iou_all_pairs(boxesA, boxesB, out=None):
+    """
+    Calculates the IoU of every box in ``boxesA`` against every box in ``boxesB``.
+
+    Runs the scalar kernel over all pairs in a parallel Numba loop, which
+    avoids the (N, M) temporaries of ``calculate_iou_matrix``. Without
+    numba it falls back to ``calculate_iou_matrix``.
+
+    Args:
+        boxesA (np.ndarray): The first set of boxes, shape (N, 4), in [x1, y1, x2, y2]
+            format, or (N, 5) from ``attach_area``.
+        boxesB (np.ndarray): The second set of boxes, shape (M, 4) or (M, 5).
+        out (np.ndarray, optional): A C-contiguous float64 (N, M) array to write into.
+
+    Returns:
+        np.ndarray: The (N, M) IoU matrix (``out`` if it was given).
+    """
+    # The kernel reads only the four coordinates, so an area column is ignored
+    boxesA = _as_boxes(boxesA, np.float64)
+    boxesB = _as_boxes(boxesB, np.float64)
+    if out is None:
+        out = np.empty((boxesA.shape[0], boxesB.shape[0]), dtype=np.float64)
+
+    if NUMBA_AVAILABLE:
+        _iou_all_pairs_kernel(boxesA, boxesB, out)
+    else:
+        calculate_iou_matrix(boxesA, boxesB, dtype=np.float64, out=out)
+    return out
+
+
+def iou_ge(boxA, boxB, num: int, den: int) -> bool:
+    """
+    Checks whether the IoU of two boxes is at least the threshold ``num / den``.
+
+    Prefer this over ``calculate_iou(...) >= threshold`` for threshold
+    queries (e.g. NMS-style matching): it cross-multiplies instead of
+    dividing, and is exact for integer pixel boxes. Widths are ``x2 - x1``
+    with no ``+ 1``, consistent with ``calculate_iou``.
+
+    Args:
+        boxA (list): The first bounding box in [x1, y1, x2, y2] format.
+        boxB (list): The second bounding box in [x1, y1, x2, y2] format.
+        num (int): The threshold numerator.
+        den (int): The threshold denominator, greater than 0.
+
+    Returns:
+        bool: True if IoU >= num / den.
+    """
     xA = max(boxA[0], boxB[0])
     yA = max(boxA[1], boxB[1])
     xB = min(boxA[2], boxB[2])
     yB = min(boxA[3], boxB[3])
 
-    # Compute the area of the intersection rectangle
-    # The intersection area is 0 if the boxes don't overlap
-    interArea = max(0, xB - xA) * max(0, yB - yA)
-
-    # Compute the area of both the prediction and ground-truth rectangles
-    boxAArea = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
-    boxBArea = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
+    # Disjoint boxes have an IoU of 0
+    if xB <= xA or yB <= yA:
+        return num <= 0
 
-    # Compute the union area by taking the sum of the two areas
-    # and subtracting the intersection area.
-    unionArea = float(boxAArea + boxBArea - interArea)
+    interArea = (xB - xA) * (yB - yA)
+    unionArea = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1]) + (boxB[2] - boxB[0]) * (boxB[3] - boxB[1]) - interArea
+    return interArea * den >= num * unionArea
 
-    # Compute the intersection over union
-    iou = interArea / unionArea if unionArea > 0 else 0
 
-    return iou
\ No newline at end of file
+def iou_ge_half(boxA, boxB) -> bool:
+    """Checks whether the IoU of two boxes is at least 0.5, i.e. ``2 * inter >= union``."""
+    return iou_ge(boxA, boxB, 1, 2)
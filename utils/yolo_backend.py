@@ -0,0 +1,311 @@
+# utils/yolo_backend.py
+import os
+import queue
+import shutil
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import torch
+from ultralytics import YOLO
+from ultralytics.engine.results import Results
+from ultralytics.utils import ops
+
+
+# A single inter-op thread avoids oversubscribing oneDNN's intra-op pool when
+# several Gradio workers run inference at once. This has to happen before any
+# parallel work starts, so it is done once at import.
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    pass  # Already configured by the host process
+
+# Resolved once per process; everything else is plain path arithmetic.
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+@lru_cache(maxsize=8)
+def resolve_model_path(path_str: str) -> Path:
+    """
+    Resolves a model path relative to the project root, with a models/ fallback.
+
+    Relative paths are tried against the project root first; if that file
+    doesn't exist, ``models/<filename>`` is tried. Results are cached, so
+    repeated agent construction doesn't stat the filesystem again.
+
+    Args:
+        path_str (str): The model path as given to the agent.
+
+    Returns:
+        Path: The resolved model path.
+    """
+    provided_path = Path(path_str).expanduser()
+    if provided_path.is_absolute():
+        return provided_path
+
+    resolved_path = Path(os.path.normpath(_PROJECT_ROOT / provided_path))
+    if not resolved_path.exists():
+        models_fallback = _PROJECT_ROOT / 'models' / provided_path.name
+        if models_fallback.exists():
+            resolved_path = models_fallback
+    return resolved_path
+
+
+def select_device() -> str:
+    """Returns ``'cuda'`` when a GPU is available, otherwise ``'cpu'``."""
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def cpu_supports_bf16() -> bool:
+    """Returns True if the CPU has native AVX-512 BF16 instructions."""
+    probe = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    return bool(probe and probe())
+
+
+def export_openvino(weights_path: Path, calib_data=None) -> Path:
+    """
+    Exports a PyTorch YOLO checkpoint to OpenVINO IR, once.
+
+    The IR is written next to the weights and reused on every subsequent
+    start. An existing INT8 model (``<stem>_int8_openvino_model/``) is always
+    preferred over the FP32 one (``<stem>_openvino_model/``). When neither
+    exists and ``calib_data`` is given, the checkpoint is quantized to INT8
+    with NNCF post-training quantization, calibrated on that dataset.
+
+    Args:
+        weights_path (Path): Path to the ``.pt`` checkpoint.
+        calib_data (str, optional): A dataset YAML with 100-300 representative
+            training images used for INT8 calibration. Defaults to the
+            ``YOLO_INT8_CALIB_DATA`` environment variable.
+
+    Returns:
+        Path: The OpenVINO model directory.
+    """
+    calib_data = calib_data or os.getenv("YOLO_INT8_CALIB_DATA")
+
+    int8_dir = weights_path.with_name(f"{weights_path.stem}_int8_openvino_model")
+    if int8_dir.exists():
+        return int8_dir
+
+    fp32_dir = weights_path.with_name(f"{weights_path.stem}_openvino_model")
+    if fp32_dir.exists() and not calib_data:
+        return fp32_dir
+
+    model = YOLO(str(weights_path))
+    if calib_data:
+        print(f"Quantizing {weights_path.name} to INT8 OpenVINO IR with {calib_data} (one-time)...")
+        return Path(model.export(format="openvino", int8=True, data=calib_data, half=False))
+
+    print(f"Exporting {weights_path.name} to OpenVINO IR (one-time)...")
+    return Path(model.export(format="openvino", half=False))
+
+
+def export_tensorrt(weights_path: Path) -> Path:
+    """
+    Builds an FP16 TensorRT engine for a PyTorch YOLO checkpoint, once per GPU.
+
+    Engines are specific to the GPU they were built on, so they are cached
+    under ``.trt_cache/<gpu name>/`` next to the weights.
+
+    Args:
+        weights_path (Path): Path to the ``.pt`` checkpoint.
+
+    Returns:
+        Path: The ``.engine`` file.
+    """
+    gpu_name = torch.cuda.get_device_name().replace(" ", "_")
+    cache_dir = weights_path.parent / ".trt_cache" / gpu_name
+    engine_path = cache_dir / f"{weights_path.stem}.engine"
+    if not engine_path.exists():
+        print(f"Building TensorRT engine for {weights_path.name} on {gpu_name} (one-time)...")
+        exported = YOLO(str(weights_path)).export(
+            format="engine", half=True, workspace=4, dynamic=False, imgsz=640
+        )
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(exported), engine_path)
+    return engine_path
+
+
+def load_yolo(weights_path: Path, device: str):
+    """
+    Loads a YOLO model, preferring an optimized backend for the device.
+
+    On CPU this is OpenVINO; Ultralytics' AutoBackend compiles the IR with the
+    LATENCY performance hint for single images and CUMULATIVE_THROUGHPUT for
+    batches. On CUDA this is an FP16 TensorRT engine. If the export fails
+    (e.g. the runtime is not installed) the PyTorch weights are used.
+
+    Args:
+        weights_path (Path): Path to the ``.pt`` checkpoint.
+        device (str): The inference device, e.g. ``'cpu'``.
+
+    Returns:
+        YOLO: The loaded model.
+    """
+    if device == "cpu" and weights_path.suffix == ".pt":
+        try:
+            ov_dir = export_openvino(weights_path)
+            print(f"Using OpenVINO backend: {ov_dir}")
+            return YOLO(str(ov_dir), task="detect")
+        except Exception as e:
+            print(f"OpenVINO backend unavailable, falling back to PyTorch: {e}")
+
+    if device == "cuda" and weights_path.suffix == ".pt":
+        try:
+            engine_path = export_tensorrt(weights_path)
+            print(f"Using TensorRT backend: {engine_path}")
+            return YOLO(str(engine_path), task="detect")
+        except Exception as e:
+            print(f"TensorRT backend unavailable, falling back to PyTorch: {e}")
+
+    model = YOLO(str(weights_path))
+    model.to(device)
+    return model
+
+
+class AsyncOVDetector:
+    """
+    Runs an OpenVINO YOLO IR through a pool of asynchronous InferRequests.
+
+    The IR is compiled with the THROUGHPUT hint, so the CPU plugin splits the
+    cores into several streams. Each concurrent caller (e.g. a parallel Gradio
+    request) takes a free request from the pool, starts it asynchronously and
+    waits on it with the GIL released, so the inferences overlap instead of
+    queueing behind one synchronous call.
+
+    Only preprocessed input tensors are accepted. The outputs are wrapped in
+    Ultralytics ``Results`` so callers handle them like regular YOLO output.
+    """
+
+    def __init__(self, ov_dir: Path, names: dict, conf: float = 0.25, iou: float = 0.7):
+        """
+        Compiles the IR and fills the request pool.
+
+        Args:
+            ov_dir (Path): The exported ``*_openvino_model`` directory.
+            names (dict): The model's class names.
+            conf (float): Confidence threshold for NMS.
+            iou (float): IoU threshold for NMS.
+        """
+        import openvino as ov
+
+        core = ov.Core()
+        cache_dir = os.getenv("OPENVINO_CACHE_DIR")
+        if cache_dir:
+            # Reuse the compiled blob across restarts instead of recompiling
+            core.set_property({"CACHE_DIR": cache_dir})
+
+        xml_path = next(Path(ov_dir).glob("*.xml"))
+        self.compiled_model = core.compile_model(
+            str(xml_path), "CPU", {"PERFORMANCE_HINT": "THROUGHPUT"}
+        )
+        num_streams = int(self.compiled_model.get_property("OPTIMAL_NUMBER_OF_INFER_REQUESTS"))
+
+        # Two requests per stream keeps every stream busy while the previous
+        # result is being post-processed.
+        self._free_requests = queue.Queue()
+        for _ in range(2 * num_streams):
+            self._free_requests.put(self.compiled_model.create_infer_request())
+
+        self.names = names
+        self.conf = conf
+        self.iou = iou
+
+    def __call__(self, tensor, verbose=False):
+        request = self._free_requests.get()
+        try:
+            request.start_async({0: tensor.numpy()})
+            request.wait()
+            output = torch.from_numpy(request.get_output_tensor(0).data.copy())
+        finally:
+            self._free_requests.put(request)
+
+        det = ops.non_max_suppression(output, self.conf, self.iou)[0]
+        # Boxes stay in the tensor's frame, like YOLO's own tensor-input results;
+        # a zero-channel placeholder carries that shape without copying pixels.
+        placeholder = np.empty((*tensor.shape[2:], 0), dtype=np.uint8)
+        return [Results(placeholder, path="", names=self.names, boxes=det)]
+
+
+def load_async_detector(weights_path: Path, names: dict, device: str):
+    """
+    Builds an AsyncOVDetector when ``OV_ASYNC_INFERENCE=1`` is set.
+
+    Args:
+        weights_path (Path): Path to the ``.pt`` checkpoint.
+        names (dict): The model's class names.
+        device (str): The inference device; only ``'cpu'`` is supported.
+
+    Returns:
+        AsyncOVDetector | None: The detector, or None if disabled or unavailable.
+    """
+    if os.getenv("OV_ASYNC_INFERENCE", "0") != "1" or device != "cpu":
+        return None
+    try:
+        detector = AsyncOVDetector(export_openvino(weights_path), names)
+        print("Using asynchronous OpenVINO inference requests.")
+        return detector
+    except Exception as e:
+        print(f"Asynchronous OpenVINO inference unavailable: {e}")
+        return None
+
+
+def boxes_xyxy(result, preproc_tensor=None, orig_shape=None):
+    """
+    Returns a result's boxes in original-image ``[x1, y1, x2, y2]`` pixels.
+
+    When the model was fed a letterboxed tensor instead of a path, Ultralytics
+    reports boxes in the tensor's coordinate frame, so they are scaled back
+    to ``orig_shape`` here. Boxes are always returned as float32, since
+    reduced-precision outputs (e.g. bfloat16) can't be converted to NumPy.
+    """
+    xyxy = result.boxes.xyxy.float()
+    if preproc_tensor is not None:
+        xyxy = ops.scale_boxes(preproc_tensor.shape[2:], xyxy.clone(), orig_shape)
+    return xyxy
+
+
+def run_yolo(model, source, device: str, async_model=None):
+    """
+    Runs YOLO inference at the lowest precision the device handles natively.
+
+    Inference runs under ``torch.inference_mode()``, which also skips autograd
+    version-counter bookkeeping that ``no_grad`` keeps. CUDA runs in FP16. PyTorch models on CPUs with AVX-512 BF16 run under
+    bfloat16 autocast. Everything else, including the OpenVINO backend, which
+    picks its own precision, runs unchanged. Preprocessed tensors go through
+    ``async_model`` when one is given.
+
+    Args:
+        model (YOLO): The loaded model.
+        source: An image path or a preprocessed input tensor.
+        device (str): The device the model was loaded on.
+        async_model (AsyncOVDetector, optional): The asynchronous OpenVINO
+            request pool for tensor inputs.
+
+    Returns:
+        list: The Ultralytics results.
+    """
+    with torch.inference_mode():
+        if async_model is not None and isinstance(source, torch.Tensor):
+            return async_model(source)
+        if device == "cuda":
+            return model(source, verbose=False, half=True)
+        if isinstance(model.model, torch.nn.Module) and cpu_supports_bf16():
+            with torch.autocast("cpu", dtype=torch.bfloat16):
+                return model(source, verbose=False)
+        return model(source, verbose=False)
+
+
+def warmup_yolo(model, device: str, async_model=None, imgsz: int = 640):
+    """
+    Runs one dummy inference so lazy backend setup happens before serving.
+
+    Ultralytics builds its predictor and compiles exported models on the
+    first call; doing that at startup keeps it off the first request.
+
+    Args:
+        model (YOLO): The loaded model.
+        device (str): The device the model was loaded on.
+        async_model (AsyncOVDetector, optional): The asynchronous request pool.
+        imgsz (int): The square input size.
+    """
+    run_yolo(model, torch.zeros(1, 3, imgsz, imgsz), device, async_model)